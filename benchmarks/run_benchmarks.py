@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""Benchmark the organiser and folder scan against a synthetic corpus.
+
+Each stage is timed over --repeat runs (the fastest run is kept) and reported
+as JSON with files/s, MB/s and peak RSS. With --baseline the results are
+compared against an earlier report, and the exit status is 1 when a stage is
+slower or larger than the thresholds allow. Runs offline; only the standard
+library is needed apart from the organiser's own optional dependencies.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import platform
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_corpus import add_corpus_arguments, corpus_kwargs, generate_corpus
+from fast_walk import walk_matching
+from folder_index import IMAGE_EXTENSIONS
+from photo_organiser import DEFAULT_WORKERS, get_date_taken, hash_file, iter_supported_files, organize_files
+
+STAGES = ("scan", "folder_scan", "date", "hash", "organize_plan", "organize_copy")
+
+def _reset_peak_rss():
+    # Linux lets a process reset its own VmHWM, which gives a per-stage peak
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def _peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_stage(stage, corpus, files, workers, scratch):
+    # Returns the number of bytes the stage processed (0 when not meaningful)
+    if stage == "scan":
+        list(iter_supported_files([corpus], workers))
+        return 0
+    if stage == "folder_scan":
+        list(walk_matching([corpus], IMAGE_EXTENSIONS, workers))
+        return 0
+    if stage == "date":
+        for file in files:
+            get_date_taken(file)
+        return 0
+    if stage == "hash":
+        total = 0
+        for file in files:
+            hash_file(file)
+            total += os.path.getsize(file)
+        return total
+    output = os.path.join(scratch, stage)
+    shutil.rmtree(output, ignore_errors=True)
+    organize_files([corpus], output, use_copy=True, plan=stage == "organize_plan", workers=workers)
+    return sum(os.path.getsize(file) for file in files)
+
+def benchmark(stage, corpus, files, workers, repeat, scratch):
+    best = None
+    peak = 0
+    scope = "stage"
+    processed = 0
+    for _ in range(repeat):
+        if not _reset_peak_rss():
+            scope = "process"
+        started = time.perf_counter()
+        processed = run_stage(stage, corpus, files, workers, scratch)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+        peak = max(peak, _peak_rss_mb())
+    result = {
+        "seconds": round(best, 4),
+        "files_per_s": round(len(files) / best, 1) if best else None,
+        "peak_rss_mb": round(peak, 1),
+        "rss_scope": scope,
+    }
+    if processed:
+        result["mb_per_s"] = round(processed / 1024 / 1024 / best, 1) if best else None
+    return result
+
+def compare(report, baseline, threshold, rss_threshold):
+    regressions = []
+    if baseline.get("corpus") != report["corpus"]:
+        regressions.append({"stage": None, "reason": "baseline was measured on a different corpus"})
+    for stage, result in report["stages"].items():
+        old = baseline.get("stages", {}).get(stage)
+        if not old:
+            continue
+        for key in ("files_per_s", "mb_per_s"):
+            if old.get(key) and result.get(key) and result[key] < old[key] * (1 - threshold):
+                regressions.append({"stage": stage, "metric": key, "baseline": old[key], "current": result[key]})
+        if old.get("peak_rss_mb") and result["peak_rss_mb"] > old["peak_rss_mb"] * (1 + rss_threshold):
+            regressions.append({"stage": stage, "metric": "peak_rss_mb",
+                                "baseline": old["peak_rss_mb"], "current": result["peak_rss_mb"]})
+    return regressions
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the photo organiser against a synthetic corpus.")
+    parser.add_argument("--corpus", help="corpus folder (default: a temp folder named after the corpus settings)")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"comma-separated subset of {', '.join(STAGES)}")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage; the fastest is reported")
+    parser.add_argument("--output", help="also write the report to this file")
+    parser.add_argument("--baseline", help="report from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed throughput drop, as a fraction")
+    parser.add_argument("--rss-threshold", type=float, default=0.25, help="allowed peak RSS growth, as a fraction")
+    add_corpus_arguments(parser)
+    return parser
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    stages = [s for s in args.stages.split(",") if s]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    settings = corpus_kwargs(args)
+    corpus = args.corpus
+    if not corpus:
+        key = hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:10]
+        corpus = os.path.join(tempfile.gettempdir(), f"photo_organiser_corpus_{key}")
+    manifest = generate_corpus(corpus, **settings)
+    files = [str(f) for f in iter_supported_files([corpus], args.workers)]
+
+    report = {
+        "corpus": manifest,
+        "environment": {
+            "python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count(), "workers": args.workers, "repeat": args.repeat,
+        },
+        "stages": {},
+    }
+    scratch = tempfile.mkdtemp(prefix="photo_organiser_bench_")
+    try:
+        for stage in stages:
+            report["stages"][stage] = benchmark(stage, corpus, files, args.workers, max(1, args.repeat), scratch)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["regressions"] = compare(report, baseline, args.threshold, args.rss_threshold)
+        status = 1 if report["regressions"] else 0
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""Generate a reproducible synthetic photo/video corpus for benchmarking.
+
+Every file is built byte by byte from a seeded random generator, so the same
+arguments always produce the same tree and no PIL or ffmpeg is needed:
+- JPEGs with an EXIF DateTimeOriginal, and JPEGs without EXIF
+- PNGs
+- MP4s (moov before mdat) and MOVs (mdat before moov) with mvhd creation times
+- a chosen share of byte-identical duplicates in other folders
+"""
+import os
+import sys
+import json
+import struct
+import zlib
+import random
+import argparse
+from datetime import datetime, timedelta, timezone
+
+MANIFEST_FILENAME = "corpus.json"
+DEFAULT_MIX = {"jpeg_exif": 50, "jpeg": 15, "png": 15, "mp4": 10, "mov": 10}
+KIND_EXTENSIONS = {"jpeg_exif": ".jpg", "jpeg": ".jpg", "png": ".png", "mp4": ".mp4", "mov": ".mov"}
+MP4_EPOCH = datetime(1904, 1, 1, tzinfo=timezone.utc)
+START_DATE = datetime(2015, 1, 1, tzinfo=timezone.utc)
+
+def _segment(marker, payload):
+    return struct.pack(">BBH", 0xFF, marker, len(payload) + 2) + payload
+
+def _exif_segment(date):
+    # Little-endian TIFF: IFD0 holds only the Exif IFD pointer, which holds DateTimeOriginal
+    value = date.strftime("%Y:%m:%d %H:%M:%S").encode() + b"\0"
+    ifd0 = struct.pack("<H", 1) + struct.pack("<HHII", 0x8769, 4, 1, 26) + struct.pack("<I", 0)
+    exif_ifd = struct.pack("<H", 1) + struct.pack("<HHII", 0x9003, 2, len(value), 44) + struct.pack("<I", 0)
+    tiff = b"II*\0" + struct.pack("<I", 8) + ifd0 + exif_ifd + value
+    return _segment(0xE1, b"Exif\0\0" + tiff)
+
+def make_jpeg(rng, size, date=None):
+    head = b"\xff\xd8"
+    if date is not None:
+        head += _exif_segment(date)
+    head += _segment(0xC0, struct.pack(">BHHBBBB", 8, 8, 8, 1, 1, 0x11, 0))
+    head += _segment(0xDA, struct.pack(">BBBBBB", 1, 1, 0, 0, 63, 0))
+    return head + rng.randbytes(max(0, size - len(head) - 2)) + b"\xff\xd9"
+
+def _png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+def make_png(rng, size):
+    # Random pixels do not compress, so the side length sets the file size
+    side = max(1, int((size / 3) ** 0.5))
+    rows = b"".join(b"\0" + rng.randbytes(side * 3) for _ in range(side))
+    return (b"\x89PNG\r\n\x1a\n"
+            + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", side, side, 8, 2, 0, 0, 0))
+            + _png_chunk(b"IDAT", zlib.compress(rows, 0))
+            + _png_chunk(b"IEND", b""))
+
+def _box(kind, payload):
+    return struct.pack(">I", len(payload) + 8) + kind + payload
+
+def _moov(date):
+    seconds = int((date - MP4_EPOCH).total_seconds())
+    mvhd = struct.pack(">IIIII", 0, seconds, seconds, 1000, 0) + b"\0" * 80
+    return _box(b"moov", _box(b"mvhd", mvhd))
+
+def make_video(rng, size, date, brand):
+    ftyp = _box(b"ftyp", brand + b"\0\0\0\0" + brand)
+    moov = _moov(date)
+    mdat = _box(b"mdat", rng.randbytes(max(0, size - len(ftyp) - len(moov) - 8)))
+    if brand == b"qt  ":
+        return ftyp + mdat + moov
+    return ftyp + moov + mdat
+
+def make_file(rng, kind, size, date):
+    if kind == "jpeg_exif":
+        return make_jpeg(rng, size, date)
+    if kind == "jpeg":
+        return make_jpeg(rng, size)
+    if kind == "png":
+        return make_png(rng, size)
+    return make_video(rng, size, date, b"isom" if kind == "mp4" else b"qt  ")
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in KIND_EXTENSIONS:
+            raise ValueError(f"unknown file kind {kind!r}; expected one of {', '.join(KIND_EXTENSIONS)}")
+        mix[kind] = float(weight)
+    return mix
+
+def generate_corpus(root, files=2000, duplicate_ratio=0.1, median_kb=256, sigma=1.0, max_mb=16,
+                    video_scale=4.0, depth=3, fanout=4, mix=None, seed=1):
+    """Write the corpus under root and return its manifest.
+
+    Sizes are log-normal around median_kb (videos scaled by video_scale) and
+    capped at max_mb. Folders are depth levels deep with fanout names per
+    level. A manifest with the parameters and totals is written to
+    corpus.json; an existing corpus with the same parameters is reused.
+    """
+    params = {
+        "files": files, "duplicate_ratio": duplicate_ratio, "median_kb": median_kb, "sigma": sigma,
+        "max_mb": max_mb, "video_scale": video_scale, "depth": depth, "fanout": fanout,
+        "mix": mix or DEFAULT_MIX, "seed": seed,
+    }
+    manifest_path = os.path.join(root, MANIFEST_FILENAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest["params"] != params:
+            raise ValueError(f"{root} holds a corpus generated with different parameters")
+        return manifest
+
+    rng = random.Random(seed)
+    kinds = list(params["mix"])
+    weights = [params["mix"][k] for k in kinds]
+    folders = ["/".join(f"d{level}_{rng.randrange(fanout)}" for level in range(depth)) for _ in range(files)]
+    originals = []
+    counts = {kind: 0 for kind in kinds}
+    counts["duplicates"] = 0
+    total_bytes = 0
+    for i in range(files):
+        folder = os.path.join(root, folders[i])
+        os.makedirs(folder, exist_ok=True)
+        date = START_DATE + timedelta(seconds=rng.randrange(10 * 365 * 86400))
+        duplicate = bool(originals) and rng.random() < duplicate_ratio
+        if duplicate:
+            source, ext = rng.choice(originals)
+            with open(source, "rb") as f:
+                data = f.read()
+            counts["duplicates"] += 1
+        else:
+            kind = rng.choices(kinds, weights)[0]
+            ext = KIND_EXTENSIONS[kind]
+            size = rng.lognormvariate(0, sigma) * median_kb * 1024
+            if kind in ("mp4", "mov"):
+                size *= video_scale
+            size = int(min(max(size, 1024), max_mb * 1024 * 1024))
+            data = make_file(rng, kind, size, date)
+            counts[kind] += 1
+        path = os.path.join(folder, f"FILE_{i:07d}{ext}")
+        with open(path, "wb") as f:
+            f.write(data)
+        if not duplicate:
+            originals.append((path, ext))
+        stamp = date.timestamp()
+        os.utime(path, (stamp, stamp))
+        total_bytes += len(data)
+
+    manifest = {"params": params, "counts": counts, "total_files": files, "total_bytes": total_bytes}
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def add_corpus_arguments(parser):
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.1, help="share of files that copy an earlier file")
+    parser.add_argument("--median-kb", type=float, default=256, help="median file size")
+    parser.add_argument("--sigma", type=float, default=1.0, help="spread of the log-normal size distribution")
+    parser.add_argument("--max-mb", type=float, default=16, help="largest file size")
+    parser.add_argument("--video-scale", type=float, default=4.0, help="videos are this much larger than images")
+    parser.add_argument("--depth", type=int, default=3, help="folder nesting depth")
+    parser.add_argument("--fanout", type=int, default=4, help="folder names per level")
+    parser.add_argument("--mix", type=parse_mix, default=None,
+                        help="file kind weights, e.g. jpeg_exif=50,jpeg=15,png=15,mp4=10,mov=10")
+    parser.add_argument("--seed", type=int, default=1)
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Generate a synthetic photo/video corpus.")
+    parser.add_argument("root", help="folder to write the corpus into")
+    add_corpus_arguments(parser)
+    return parser
+
+def corpus_kwargs(args):
+    return {
+        "files": args.files, "duplicate_ratio": args.duplicate_ratio, "median_kb": args.median_kb,
+        "sigma": args.sigma, "max_mb": args.max_mb, "video_scale": args.video_scale, "depth": args.depth,
+        "fanout": args.fanout, "mix": args.mix, "seed": args.seed,
+    }
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    manifest = generate_corpus(args.root, **corpus_kwargs(args))
+    print(json.dumps(manifest, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_WALK_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+WALK_REPORT_INTERVAL = 1.0
+
+class WalkStats:
+    def __init__(self):
+        self.dirs = 0
+        self.entries = 0
+        self.matched = 0
+        self.errors = 0
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self):
+        return self.entries / max(self.elapsed, 1e-6)
+
+    def describe(self):
+        return f"{self.entries} entries in {self.dirs} folders ({self.rate:,.0f} entries/s)"
+
+def list_dir(path, extensions=None, skip_hidden=False):
+    # Returns (matching file names, subfolder paths, entries seen), with None
+    # for the names if path cannot be listed. DirEntry.is_dir/is_file answer
+    # from d_type on most filesystems, so no stat call is made per entry.
+    files = []
+    subdirs = []
+    entries = 0
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                entries += 1
+                name = entry.name
+                if skip_hidden and name.startswith("."):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                        continue
+                    if extensions is not None:
+                        dot = name.rfind(".")
+                        if dot <= 0 or name[dot:].lower() not in extensions:
+                            continue
+                    if entry.is_file():
+                        files.append(name)
+                except OSError:
+                    continue
+    except OSError:
+        return None, [], 0
+    return files, subdirs, entries
+
+def walk_matching(roots, extensions=None, workers=DEFAULT_WALK_WORKERS, skip_dir=None, skip_hidden=False,
+                  report_callback=None, stats=None):
+    """Yield (folder, file names) for every folder holding matching files.
+
+    Folders are listed with os.scandir on a thread pool, so sibling subtrees
+    are read in parallel, but results come out depth-first in directory order,
+    the same order Path.rglob gives. extensions is a set of lower-case
+    suffixes including the dot, or None for every file. skip_dir(path) can
+    prune a subtree. report_callback(stats) is called at
+    most every WALK_REPORT_INTERVAL seconds and once at the end.
+    """
+    stats = stats if stats is not None else WalkStats()
+    last_report = stats.started
+    pool = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        # Only the children of folders already yielded are queued, so memory
+        # follows the walk frontier rather than the whole tree
+        stack = [(root, pool.submit(list_dir, root, extensions, skip_hidden))
+                 for root in reversed([os.path.abspath(r) for r in roots])]
+        while stack:
+            folder, future = stack.pop()
+            files, subdirs, entries = future.result()
+            stats.dirs += 1
+            stats.entries += entries
+            if files is None:
+                stats.errors += 1
+                continue
+            stack.extend((sub, pool.submit(list_dir, sub, extensions, skip_hidden))
+                         for sub in reversed(subdirs) if skip_dir is None or not skip_dir(sub))
+            if report_callback is not None and time.monotonic() - last_report >= WALK_REPORT_INTERVAL:
+                last_report = time.monotonic()
+                report_callback(stats)
+            if files:
+                stats.matched += len(files)
+                yield folder, files
+        if report_callback is not None:
+            report_callback(stats)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Persistent index of a photo library's folders for the Folder Naming Assistant.
+
+Each folder is stored with its mtime and image count, together with whether
+it has been renamed or skipped. A refresh only stats known folders (on a
+thread pool) and relists those whose mtime changed, so reopening a large
+library is fast and the session picks up where it stopped.
+"""
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fast_walk import DEFAULT_WALK_WORKERS, list_dir
+
+INDEX_FILENAME = ".folder_namer_index.sqlite"
+STAT_CHUNK = 256
+# The image types the Folder Naming Assistant counts and previews
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS folders (
+        path TEXT PRIMARY KEY, mtime_ns INTEGER, images INTEGER
+    );
+    CREATE TABLE IF NOT EXISTS status (
+        path TEXT PRIMARY KEY, status TEXT
+    );
+"""
+
+def _stat_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def _stat_chunk(paths):
+    return [_stat_mtime(path) for path in paths]
+
+def _list_folder(path):
+    # Returns (mtime_ns, image count, subfolders), or None if path is gone.
+    # The mtime is taken first so a change during the listing is seen next time.
+    mtime_ns = _stat_mtime(path)
+    if mtime_ns is None:
+        return None
+    images, subdirs, _ = list_dir(path, IMAGE_EXTENSIONS)
+    if images is None:
+        return None
+    return mtime_ns, len(images), subdirs
+
+def _connect(db_path):
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.executescript(SCHEMA)
+    return conn
+
+class FolderIndex:
+    """Folders under root with their image counts and renamed/skipped status.
+
+    Stored in root/.folder_namer_index.sqlite, or in memory for this session
+    when the library is read-only.
+    """
+
+    def __init__(self, root, db_path=None):
+        self.root = os.path.realpath(root)
+        self.lock = threading.Lock()
+        try:
+            self.conn = _connect(db_path or os.path.join(self.root, INDEX_FILENAME))
+        except sqlite3.Error:
+            self.conn = _connect(":memory:")
+
+    def refresh(self, workers=DEFAULT_WALK_WORKERS):
+        """Brings the index up to date; returns the number of folders relisted."""
+        with self.lock:
+            known = dict(self.conn.execute("SELECT path, mtime_ns FROM folders"))
+        paths = list(known) if known else [self.root]
+        relisted = 0
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            chunks = [paths[i:i + STAT_CHUNK] for i in range(0, len(paths), STAT_CHUNK)]
+            mtimes = dict(zip(paths, (m for chunk in pool.map(_stat_chunk, chunks) for m in chunk)))
+            gone = [path for path, mtime_ns in mtimes.items() if mtime_ns is None and path in known]
+            pending = [path for path, mtime_ns in mtimes.items()
+                       if mtime_ns is not None and known.get(path) != mtime_ns]
+            seen = set(pending)
+            while pending:
+                listings = list(pool.map(_list_folder, pending))
+                relisted += len(pending)
+                found = []
+                with self.lock:
+                    for path, listing in zip(pending, listings):
+                        if listing is None:
+                            gone.append(path)
+                            continue
+                        mtime_ns, images, subdirs = listing
+                        self.conn.execute("INSERT OR REPLACE INTO folders (path, mtime_ns, images) VALUES (?, ?, ?)",
+                                          (path, mtime_ns, images))
+                        # New subfolders are listed in the next round
+                        for sub in subdirs:
+                            if sub not in known and sub not in seen:
+                                seen.add(sub)
+                                found.append(sub)
+                pending = found
+        with self.lock:
+            for path in gone:
+                self.conn.execute("DELETE FROM folders WHERE path = ?", (path,))
+                self.conn.execute("DELETE FROM status WHERE path = ?", (path,))
+            self.conn.commit()
+        return relisted
+
+    def folders(self):
+        """Returns sorted (path, image count, status) for folders holding images."""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT folders.path, images, status FROM folders LEFT JOIN status ON folders.path = status.path "
+                "WHERE images > 0 ORDER BY folders.path").fetchall()
+
+    def set_status(self, path, status):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO status (path, status) VALUES (?, ?)", (path, status))
+            self.conn.commit()
+
+    def renamed(self, old_path, new_path):
+        # Moves the folder's entry (and anything below it) to its new name
+        with self.lock:
+            prefix = old_path + os.sep
+            for table in ("folders", "status"):
+                rows = self.conn.execute(
+                    f"SELECT path FROM {table} WHERE path = ? OR substr(path, 1, ?) = ?",
+                    (old_path, len(prefix), prefix)).fetchall()
+                for (path,) in rows:
+                    self.conn.execute(f"DELETE FROM {table} WHERE path = ?", (new_path + path[len(old_path):],))
+                    self.conn.execute(f"UPDATE {table} SET path = ? WHERE path = ?",
+                                      (new_path + path[len(old_path):], path))
+            self.conn.execute("INSERT OR REPLACE INTO status (path, status) VALUES (?, ?)", (new_path, "renamed"))
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -2,41 +2,142 @@
 import os
 import tkinter as tk
 from tkinter import filedialog, messagebox
-from PIL import Image, ImageTk
-import glob
-from pathlib import Path
-
-def get_folders_with_images(root_folder):
-    supported_extensions = ('.jpg', '.jpeg', '.png')
-    folders_with_images = set()
-    for path in Path(root_folder).rglob("*"):
-        if path.is_file() and path.suffix.lower() in supported_extensions:
-            folders_with_images.add(str(path.parent.resolve()))
-    return sorted(folders_with_images)
+import queue
+import threading
+from collections import deque
+from itertools import zip_longest
+
+from fast_walk import list_dir
+from folder_index import IMAGE_EXTENSIONS, FolderIndex
+from thumbnail_cache import THUMBNAIL_SIZE, ThumbnailCache
+from time_index import DEFAULT_EVENT_GAP_HOURS, TimeIndex, cluster_folders
 
 def get_preview_images(folder_path, max_images=5):
     if not folder_path:
         return []
-    exts = ["*.jpg", "*.jpeg", "*.png"]
-    images = []
-    for ext in exts:
-        images.extend(glob.glob(os.path.join(folder_path, ext)))
-    return images[:max_images]
+    names, _, _ = list_dir(folder_path, IMAGE_EXTENSIONS)
+    return [os.path.join(folder_path, name) for name in (names or [])[:max_images]]
 
 def is_folder_named(folder):
     base = os.path.basename(folder)
     return len(base) > 10 and base[10] == ' '
 
+EVENT_PREVIEWS = 5
+PREFETCH_AHEAD = 5
+PREFETCH_FULL_AHEAD = 1
+PREFETCH_WORKERS = 2
+PREFETCH_QUEUE_SIZE = 10
+PREFETCH_POLL_MS = 30
+PREFETCH_PHOTOS_PER_TICK = 4
+
+class FolderPrefetcher:
+    """Lists and decodes preview images for upcoming folders on background threads.
+
+    schedule() replaces the pending (folder, box) jobs. Decoded PIL images
+    reach the Tk thread through a bounded queue, so a UI that falls behind
+    stalls the workers instead of growing memory. cancel() drops pending
+    work and marks anything already decoded as stale.
+    """
+
+    def __init__(self, thumbnails, workers=PREFETCH_WORKERS):
+        self.thumbnails = thumbnails
+        self.results = queue.Queue(maxsize=PREFETCH_QUEUE_SIZE)
+        self.condition = threading.Condition()
+        self.jobs = deque()
+        self.done = set()
+        self.listings = {}
+        self.generation = 0
+        for _ in range(workers):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    def schedule(self, jobs):
+        with self.condition:
+            wanted = {folder for folder, _ in jobs}
+            self.done = {job for job in self.done if job[0] in wanted}
+            self.listings = {folder: images for folder, images in self.listings.items() if folder in wanted}
+            self.jobs = deque(job for job in jobs if job not in self.done)
+            self.condition.notify_all()
+
+    def cancel(self):
+        with self.condition:
+            self.generation += 1
+            self.jobs.clear()
+            self.done.clear()
+            self.listings.clear()
+        while True:
+            try:
+                self.results.get_nowait()
+            except queue.Empty:
+                break
+
+    def listing(self, folder):
+        with self.condition:
+            images = self.listings.get(folder)
+        if images is None:
+            images = get_preview_images(folder, max_images=5)
+            with self.condition:
+                self.listings[folder] = images
+        return images
+
+    def _work(self):
+        while True:
+            with self.condition:
+                while not self.jobs:
+                    self.condition.wait()
+                job = self.jobs.popleft()
+                self.done.add(job)
+                generation = self.generation
+            folder, box = job
+            for path in self.listing(folder):
+                if generation != self.generation:
+                    break
+                try:
+                    image = self.thumbnails.image(path, box)
+                except Exception:
+                    continue
+                self.results.put((generation, path, box, image))
+
+    def ready(self, limit):
+        # Tk thread: up to limit decoded images from the current root folder
+        results = []
+        while len(results) < limit:
+            try:
+                generation, path, box, image = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if generation == self.generation:
+                results.append((path, box, image))
+        return results
+
 class FolderNamerApp:
+    """Names date folders one event at a time.
+
+    Consecutive folders whose photos are at most the event gap apart (see
+    time_index) form an event. Naming an event renames each of its folders
+    to "YYYY-MM-DD <name>", keeping each folder's own date.
+    """
+
     def __init__(self, root):
         self.root = root
         self.root.title("Folder Naming Assistant")
         self.current_folder_path = None
+        self.current_event = []
         self.folder_list = []
+        self.events = []
+        self.event_index = 0
+        self.status = {}
+        self.image_counts = {}
+        self.index = None
+        self.time_index = None
+        self.thumbnails = ThumbnailCache()
+        self.prefetcher = FolderPrefetcher(self.thumbnails)
 
         self.title_label = tk.Label(root, text="", font=("Arial", 12, "bold"))
         self.title_label.pack(pady=5)
 
+        self.detail_label = tk.Label(root, text="")
+        self.detail_label.pack()
+
         self.thumbnail_frame = tk.Frame(root)
         self.thumbnail_frame.pack()
 
@@ -52,60 +153,183 @@ class FolderNamerApp:
         self.button_frame = tk.Frame(root)
         self.button_frame.pack(pady=5)
 
+        tk.Button(self.button_frame, text="◀ Previous Event", command=self.previous_event).pack(side=tk.LEFT, padx=5)
         tk.Button(self.button_frame, text="Rename", command=self.rename_folder).pack(side=tk.LEFT, padx=5)
-        tk.Button(self.button_frame, text="Skip", command=self.next_folder).pack(side=tk.LEFT, padx=5)
+        tk.Button(self.button_frame, text="Skip", command=self.skip_folder).pack(side=tk.LEFT, padx=5)
+        tk.Button(self.button_frame, text="Next Event ▶", command=self.next_event).pack(side=tk.LEFT, padx=5)
         tk.Button(self.button_frame, text="Choose Folder", command=self.select_input_folder).pack(side=tk.LEFT, padx=5)
         tk.Button(self.button_frame, text="Open in Explorer", command=self.open_in_explorer).pack(side=tk.LEFT, padx=5)
 
+        # A gap of 0 names folders one at a time
+        self.gap_frame = tk.Frame(root)
+        self.gap_frame.pack(pady=5)
+        tk.Label(self.gap_frame, text="New event after a gap of (hours):").pack(side=tk.LEFT)
+        self.gap_hours = tk.IntVar(value=DEFAULT_EVENT_GAP_HOURS)
+        gap_box = tk.Spinbox(self.gap_frame, from_=0, to=24 * 14, width=5, textvariable=self.gap_hours,
+                             command=self.regroup)
+        gap_box.pack(side=tk.LEFT, padx=5)
+        gap_box.bind("<Return>", lambda event: self.regroup())
+
+        self.root.bind("<Prior>", lambda event: self.previous_event())
+        self.root.bind("<Next>", lambda event: self.next_event())
         self.root.after(100, self.select_input_folder)
+        self.root.after(PREFETCH_POLL_MS, self.poll_prefetch)
 
     def select_input_folder(self):
         folder = filedialog.askdirectory(title="Select Root Folder")
         if not folder:
             return
-        self.folder_list = [f for f in get_folders_with_images(folder) if not is_folder_named(f)]
-        self.folder_index = 0
+        self.prefetcher.cancel()
+        if self.index is not None:
+            self.index.close()
+        # Only folders changed since the last session are rescanned, and the
+        # session resumes at the first event not yet renamed or skipped
+        self.index = FolderIndex(folder)
+        self.index.refresh()
+        self.time_index = TimeIndex(folder)
+        rows = [row for row in self.index.folders() if not is_folder_named(row[0])]
+        self.folder_list = [path for path, _, _ in rows]
+        self.image_counts = {path: images for path, images, _ in rows}
+        self.status = {path: status for path, _, status in rows}
+        self.event_index = None
+        self.regroup()
+
+    def regroup(self):
+        # Recomputes the events, staying on the current folder when there is one
+        if self.time_index is None:
+            return
+        try:
+            gap_hours = max(0, self.gap_hours.get())
+        except tk.TclError:
+            return
+        self.events = cluster_folders(self.folder_list, self.time_index, gap_hours)
+        if self.event_index is None or self.current_folder_path not in self.folder_list:
+            self.event_index = self.next_pending(0)
+        else:
+            self.event_index = next(i for i, event in enumerate(self.events) if self.current_folder_path in event)
+        self.show_event()
+
+    def next_pending(self, start):
+        # Index of the first event from start on with a folder not yet renamed or skipped
+        return next((i for i in range(start, len(self.events))
+                     if any(self.status.get(folder) is None for folder in self.events[i])), len(self.events))
+
+    def skip_folder(self):
+        if self.index is not None:
+            for folder in self.current_event:
+                self.index.set_status(folder, "skipped")
+                self.status[folder] = "skipped"
         self.next_folder()
 
     def next_folder(self):
-        if self.folder_index >= len(self.folder_list):
+        self.event_index = self.next_pending(self.event_index + 1)
+        if self.event_index >= len(self.events):
+            self.event_index = self.next_pending(0)
+        self.show_event()
+
+    def previous_event(self):
+        if self.events and self.event_index > 0:
+            self.event_index -= 1
+            self.show_event()
+
+    def next_event(self):
+        if self.event_index + 1 < len(self.events):
+            self.event_index += 1
+            self.show_event()
+
+    def show_event(self):
+        if self.event_index >= len(self.events):
             messagebox.showinfo("Done", "No more folders to process.")
             self.root.quit()
             return
-        self.current_folder_path = self.folder_list[self.folder_index]
-        self.folder_index += 1
+        self.current_event = self.events[self.event_index]
+        self.current_folder_path = self.current_event[0]
         self.entry.delete(0, tk.END)
-        self.title_label.config(text=self.current_folder_path.replace("/", "\\"))
+        first, last = (os.path.basename(folder)[:10] for folder in (self.current_event[0], self.current_event[-1]))
+        if len(self.current_event) == 1:
+            self.title_label.config(text=self.current_folder_path.replace("/", "\\"))
+        else:
+            self.title_label.config(text=f"{os.path.dirname(self.current_folder_path)} / {first} to {last}".replace("/", "\\"))
+        images = sum(self.image_counts.get(folder, 0) for folder in self.current_event)
+        done = sum(1 for folder in self.current_event if self.status.get(folder) is not None)
+        self.detail_label.config(text=f"{len(self.current_event)} folders, {images} images"
+                                 + (f", {done} already renamed or skipped" if done else ""))
         self.display_thumbnails()
-        self.progress_label.config(text=f"Progress: {self.folder_index} / {len(self.folder_list)}")
+        processed = sum(1 for status in self.status.values() if status is not None)
+        self.progress_label.config(text=f"Event {self.event_index + 1} / {len(self.events)}  "
+                                        f"(folders done: {processed} / {len(self.folder_list)})")
+        self.schedule_prefetch()
+
+    def preview_folders(self, event):
+        # Folders to draw previews from: evenly spaced through a long event
+        if len(event) <= EVENT_PREVIEWS:
+            return event
+        step = (len(event) - 1) / (EVENT_PREVIEWS - 1)
+        return [event[round(i * step)] for i in range(EVENT_PREVIEWS)]
+
+    def screen_box(self):
+        return (self.root.winfo_screenwidth(), self.root.winfo_screenheight())
+
+    def schedule_prefetch(self):
+        # Next event's thumbnails first, then full-size previews for the
+        # current and next events, then thumbnails further ahead
+        upcoming = [self.preview_folders(event)
+                    for event in self.events[self.event_index + 1:self.event_index + 1 + PREFETCH_AHEAD]]
+        screen = self.screen_box()
+        jobs = [(folder, THUMBNAIL_SIZE) for event in upcoming[:1] for folder in event]
+        jobs += [(folder, screen) for folder in self.preview_folders(self.current_event)]
+        jobs += [(folder, screen) for event in upcoming[:PREFETCH_FULL_AHEAD] for folder in event]
+        jobs += [(folder, THUMBNAIL_SIZE) for event in upcoming[1:] for folder in event]
+        self.prefetcher.schedule(list(dict.fromkeys(jobs)))
+
+    def poll_prefetch(self):
+        for path, box, image in self.prefetcher.ready(PREFETCH_PHOTOS_PER_TICK):
+            try:
+                self.thumbnails.photo(path, box, image)
+            except Exception:
+                pass
+        self.root.after(PREFETCH_POLL_MS, self.poll_prefetch)
 
     def rename_folder(self, event=None):
+        # Gives every folder of the event the new name after its own date
         new_name = self.entry.get().strip()
         if not new_name:
             return
-        parent = os.path.dirname(self.current_folder_path)
-        base = os.path.basename(self.current_folder_path)
-        if len(base) >= 10:
-            prefix = base[:10]
-            new_folder = os.path.join(parent, f"{prefix} {new_name}")
+        failed = []
+        for position, folder in enumerate(self.current_event):
+            base = os.path.basename(folder)
+            if len(base) < 10:
+                continue
+            new_folder = os.path.join(os.path.dirname(folder), f"{base[:10]} {new_name}")
             try:
-                os.rename(self.current_folder_path, new_folder)
-                self.folder_list[self.folder_index - 1] = new_folder
+                os.rename(folder, new_folder)
             except Exception as e:
-                messagebox.showerror("Error", f"Failed to rename folder: {e}")
+                failed.append(f"{base}: {e}")
+                continue
+            self.current_event[position] = new_folder
+            self.folder_list[self.folder_list.index(folder)] = new_folder
+            self.image_counts[new_folder] = self.image_counts.pop(folder, 0)
+            self.status.pop(folder, None)
+            self.status[new_folder] = "renamed"
+            if folder in self.time_index.spans:
+                self.time_index.spans[new_folder] = self.time_index.spans.pop(folder)
+            if self.index is not None:
+                self.index.renamed(folder, new_folder)
+        if failed:
+            messagebox.showerror("Error", "Failed to rename folder:\n" + "\n".join(failed))
         self.next_folder()
 
     def display_thumbnails(self):
         for widget in self.thumbnail_frame.winfo_children():
             widget.destroy()
-        if not self.current_folder_path:
+        if not self.current_event:
             return
-        images = get_preview_images(self.current_folder_path, max_images=5)
+        # Round-robin over the event's folders, so every day shows up
+        listings = [self.prefetcher.listing(folder) for folder in self.preview_folders(self.current_event)]
+        images = [path for row in zip_longest(*listings) for path in row if path][:EVENT_PREVIEWS]
         for img_path in images:
             try:
-                img = Image.open(img_path)
-                img.thumbnail((350, 350))
-                tk_img = ImageTk.PhotoImage(img)
+                tk_img = self.thumbnails.photo(img_path, THUMBNAIL_SIZE)
                 label = tk.Label(self.thumbnail_frame, image=tk_img, bg="black")
                 label.image = tk_img
                 label.pack(side=tk.LEFT, padx=5)
@@ -116,11 +340,7 @@ class FolderNamerApp:
 
     def show_full_image(self, image_path):
         try:
-            image = Image.open(image_path)
-            screen_width = self.root.winfo_screenwidth()
-            screen_height = self.root.winfo_screenheight()
-            image.thumbnail((screen_width, screen_height))
-            self.full_image = ImageTk.PhotoImage(image)
+            self.full_image = self.thumbnails.photo(image_path, self.screen_box())
             self.full_image_window = tk.Toplevel(self.root)
             self.full_image_window.configure(bg="black")
             self.full_image_window.attributes("-fullscreen", True)
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""Concurrent, device-aware scheduling of file copies and moves.
+
+Each job is started only while its source and target devices are below
+their concurrency limit (by device kind: SSD, rotational, network) and
+the bytes in flight stay under a total limit. Jobs reading from a
+rotational disk run in inode order, which roughly follows their position
+on disk, so a spinning source is read with few seeks. Devices are
+identified from /proc/self/mountinfo and /sys on Linux; elsewhere every
+device is treated as "unknown".
+"""
+import os
+import time
+import threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+DEVICE_CONCURRENCY = {"ssd": 4, "rotational": 1, "network": 2, "unknown": 2}
+BYTES_IN_FLIGHT = 256 * 1024 * 1024
+STATUS_INTERVAL = 1.0
+SCHEDULE_CHUNK = 4096
+NETWORK_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "fuse.sshfs", "9p", "afs", "ceph", "glusterfs"}
+
+_mounts = None
+_devices = {}
+_devices_lock = threading.Lock()
+
+def _unescape(field):
+    # mountinfo escapes space, tab, newline and backslash as octal
+    return field.encode().decode("unicode_escape")
+
+def _read_mountinfo():
+    # Maps "major:minor" to (mount point, filesystem type, source)
+    global _mounts
+    if _mounts is None:
+        mounts = {}
+        try:
+            with open("/proc/self/mountinfo", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    left, _, right = line.partition(" - ")
+                    fields, extra = left.split(), right.split()
+                    if len(fields) >= 5 and len(extra) >= 2:
+                        mounts[fields[2]] = (_unescape(fields[4]), extra[0], _unescape(extra[1]))
+        except OSError:
+            pass
+        _mounts = mounts
+    return _mounts
+
+def _rotational(major, minor):
+    # Partitions keep the queue settings on their parent disk
+    base = f"/sys/dev/block/{major}:{minor}"
+    for path in (f"{base}/queue/rotational", f"{base}/../queue/rotational"):
+        try:
+            with open(path) as f:
+                return f.read().strip() == "1"
+        except OSError:
+            continue
+    return None
+
+class DeviceInfo:
+    def __init__(self, dev, name, kind):
+        self.dev = dev
+        self.name = name
+        self.kind = kind
+        self.limit = DEVICE_CONCURRENCY[kind]
+
+def device_info(dev):
+    """Returns the DeviceInfo for a st_dev value; results are cached."""
+    with _devices_lock:
+        info = _devices.get(dev)
+        if info is None:
+            info = _devices[dev] = _probe(dev)
+        return info
+
+def _probe(dev):
+    if not hasattr(os, "major"):
+        # Windows: st_dev is a volume serial number with no block device behind it
+        return DeviceInfo(dev, str(dev), "unknown")
+    major, minor = os.major(dev), os.minor(dev)
+    mount = _read_mountinfo().get(f"{major}:{minor}")
+    if mount is None:
+        return DeviceInfo(dev, f"{major}:{minor}", "unknown")
+    mount_point, fstype, source = mount
+    name = os.path.basename(source) if source.startswith("/dev/") else mount_point
+    if fstype in NETWORK_FILESYSTEMS or fstype.startswith("fuse.") and ":" in source:
+        return DeviceInfo(dev, source, "network")
+    rotational = _rotational(major, minor)
+    if rotational is None and source.startswith("/dev/"):
+        # Filesystems such as btrfs report an anonymous device; ask the block device instead
+        try:
+            rdev = os.stat(source).st_rdev
+            rotational = _rotational(os.major(rdev), os.minor(rdev))
+        except OSError:
+            pass
+    if rotational is None:
+        return DeviceInfo(dev, name, "unknown" if source.startswith("/dev/") else "ssd")
+    return DeviceInfo(dev, name, "rotational" if rotational else "ssd")
+
+def _nearest_dev(folder):
+    # st_dev of folder, or of its closest existing parent if not created yet
+    while True:
+        try:
+            return os.stat(folder).st_dev
+        except OSError:
+            parent = os.path.dirname(folder)
+            if parent == folder:
+                return None
+            folder = parent
+
+class CopyScheduler:
+    """Runs placement jobs on a thread pool within per-device and byte limits.
+
+    status_callback(text), if given, receives the throughput per device at
+    most every STATUS_INTERVAL seconds while jobs run.
+    """
+
+    def __init__(self, workers, bytes_in_flight=BYTES_IN_FLIGHT, status_callback=None):
+        self.workers = max(1, workers)
+        self.bytes_in_flight = bytes_in_flight
+        self.status_callback = status_callback
+        self.bytes_read = Counter()
+        self.bytes_written = Counter()
+        self.devices = {}
+        self.target_devs = {}
+        self.seconds = 0.0
+
+    def _prepare(self, jobs):
+        # Groups jobs by source device; returns {device: deque of prepared jobs}
+        queues = {}
+        target_devs = self.target_devs
+        for item, source, target, size, is_move, src, ino in jobs:
+            folder = os.path.dirname(target)
+            if folder not in target_devs:
+                target_devs[folder] = _nearest_dev(folder)
+            dst = target_devs[folder]
+            if src is None:
+                try:
+                    st = os.stat(source)
+                    src, ino = st.st_dev, st.st_ino
+                except OSError:
+                    src, ino = None, 0  # the job itself reports the missing source
+            # A rename on the same device moves no data
+            nbytes = 0 if is_move and src == dst else size or 0
+            for dev in (src, dst):
+                if dev is not None and dev not in self.devices:
+                    self.devices[dev] = device_info(dev)
+            job = (item, src, dst, nbytes)
+            if src is not None and self.devices[src].kind == "rotational":
+                queues.setdefault(src, []).append((ino, job))
+            else:
+                queues.setdefault(src, deque()).append(job)
+        for src, entries in queues.items():
+            if isinstance(entries, list):
+                # Stable, so jobs on the same inode keep their plan order
+                entries.sort(key=lambda entry: entry[0])
+                queues[src] = deque(job for _, job in entries)
+        return queues
+
+    def run(self, jobs, func, progress=None):
+        """Calls func(item) for every (item, source, target, size, is_move, dev, ino) job.
+
+        dev and ino are the source's st_dev and st_ino as recorded when it
+        was planned, or None to stat the source here. jobs may be any
+        iterable; it is read SCHEDULE_CHUNK jobs at a time, the next chunk
+        once every job of the previous one has started, so the first jobs
+        start without reading the rest.
+
+        Jobs from one source device start in plan order, or inode order
+        within each chunk on a rotational disk. progress(done) is called with
+        the number of finished jobs as they finish. If a job raises, no
+        further jobs start and the first error is re-raised once the running
+        ones have finished.
+        """
+        jobs = iter(jobs)
+        queues = {}
+        exhausted = False
+        active = Counter()
+        cond = threading.Condition()
+        state = {"in_flight": 0, "running": 0, "done": 0, "error": None}
+        started = time.monotonic()
+        last_status = started
+        last_bytes = Counter()
+
+        def limit(dev):
+            return self.devices[dev].limit if dev is not None else self.workers
+
+        def can_start(job):
+            _, src, dst, nbytes = job
+            if state["running"] >= self.workers:
+                return False
+            if active[src] >= limit(src) or (dst != src and active[dst] >= limit(dst)):
+                return False
+            # A job larger than the limit still runs, on its own
+            return state["in_flight"] == 0 or state["in_flight"] + nbytes <= self.bytes_in_flight
+
+        def work(job):
+            item, src, dst, nbytes = job
+            try:
+                func(item)
+            except Exception as e:
+                with cond:
+                    state["error"] = state["error"] or e
+            finally:
+                with cond:
+                    for dev in {src, dst}:
+                        active[dev] -= 1
+                    state["in_flight"] -= nbytes
+                    state["running"] -= 1
+                    state["done"] += 1
+                    self.bytes_read[src] += nbytes
+                    self.bytes_written[dst] += nbytes
+                    done = state["done"]
+                    cond.notify()
+                if progress is not None:
+                    progress(done)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool, cond:
+            while True:
+                if not queues and not exhausted and state["error"] is None:
+                    chunk = list(islice(jobs, SCHEDULE_CHUNK))
+                    exhausted = len(chunk) < SCHEDULE_CHUNK
+                    queues = self._prepare(chunk)
+                if not ((queues and state["error"] is None) or state["running"]):
+                    break
+                # Only the head of each device's queue may start, which keeps its order
+                for dev in list(queues) if state["error"] is None else []:
+                    queue = queues[dev]
+                    while queue and can_start(queue[0]):
+                        job = queue.popleft()
+                        for d in {job[1], job[2]}:
+                            active[d] += 1
+                        state["in_flight"] += job[3]
+                        state["running"] += 1
+                        pool.submit(work, job)
+                    if not queue:
+                        del queues[dev]
+                if state["running"]:
+                    cond.wait(STATUS_INTERVAL)
+                now = time.monotonic()
+                if self.status_callback is not None and now - last_status >= STATUS_INTERVAL:
+                    status = self._describe(last_bytes, now - last_status)
+                    if status:
+                        self.status_callback(status)
+                    last_status = now
+        self.seconds += time.monotonic() - started
+        if state["error"] is not None:
+            raise state["error"]
+
+    def _describe(self, last_bytes, elapsed):
+        # Throughput per device since the previous status line
+        parts = []
+        for dev, info in self.devices.items():
+            read = self.bytes_read[dev] - last_bytes[("r", dev)]
+            written = self.bytes_written[dev] - last_bytes[("w", dev)]
+            last_bytes[("r", dev)], last_bytes[("w", dev)] = self.bytes_read[dev], self.bytes_written[dev]
+            if read:
+                parts.append(f"{info.name} {read / elapsed / 1024 / 1024:.0f} MB/s read")
+            if written:
+                parts.append(f"{info.name} {written / elapsed / 1024 / 1024:.0f} MB/s write")
+        return ", ".join(parts)
+
+    def summary(self):
+        """Returns {device name: {kind, bytes_read, bytes_written}} for the devices used."""
+        return {info.name: {"kind": info.kind, "bytes_read": self.bytes_read[dev],
+                            "bytes_written": self.bytes_written[dev]}
+                for dev, info in self.devices.items()}
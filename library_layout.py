@@ -0,0 +1,10 @@
+#!/usr/bin/env python3
+"""Names of the files and folders the organiser keeps in its output library.
+
+Shared by the organiser and the Folder Naming Assistant, so the namer can
+find the library index without importing the organiser engine.
+"""
+
+LIBRARY_FILENAME = ".organiser_library.sqlite"
+# Folders the organiser files copies and doubtful files into; their dates are not events
+MANAGED_FOLDERS = ("duplicates", "near_duplicates", "unsure")
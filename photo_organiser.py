@@ -0,0 +1,2780 @@
+#!/usr/bin/env python3
+"""Photo Organiser engine and command-line interface.
+
+Importing this module does not load tkinter or PIL, so it can be used from
+headless batch workers. The GUI lives in photo_organiser_gui_v1.1.py.
+"""
+import os
+import sys
+import json
+import argparse
+import io
+import shutil
+import hashlib
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import threading
+import subprocess
+import struct
+import csv
+import sqlite3
+import queue
+import uuid
+import time
+import signal
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+import heapq
+from array import array
+from collections import Counter, defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from fast_walk import walk_matching
+from watch_folder import WATCH_POLL_INTERVAL, open_watcher
+from io_scheduler import CopyScheduler
+from library_layout import LIBRARY_FILENAME
+
+SUPPORTED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".mov", ".mp4", ".heic"}
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".heic"}
+VIDEO_EXTENSIONS = {".mov", ".mp4"}
+PROBE_PENDING = "probe-pending"
+MP4_EPOCH = datetime(1904, 1, 1, tzinfo=timezone.utc)
+PARTIAL_BLOCK_SIZE = 64 * 1024
+HEAD_READ_SIZE = 256 * 1024
+CACHE_FILENAME = ".organiser_cache.sqlite"
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+DEFAULT_QUEUE_SIZE = 256
+POOL_TASKS_PER_WORKER = 4
+COPY_BUFFER_SIZE = 1024 * 1024
+HASH_READ_SIZE = 256 * 1024
+FICLONE = 0x40049409
+DUPLICATE_MODES = ("copy", "hardlink", "record")
+PLAN_FILENAME = "organiser_plan.jsonl"
+JOURNAL_FILENAME = "organiser_journal.jsonl"
+JOURNAL_SYNC_EVERY = 64
+METRICS_FILENAME = "organiser_metrics.json"
+PROFILE_FILENAME = "organiser_profile.pstats"
+PROFILERS = ("cprofile", "sample")
+PROFILE_SAMPLE_INTERVAL = 0.005
+PROFILE_TOP = 25
+SLOWEST_FILES = 20
+NEAR_DUPLICATE_MODES = ("report", "route")
+NEAR_DUPLICATE_THRESHOLD = 6
+DHASH_SIZE = 8
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+EXIF_IFD_POINTER = 0x8769
+EXIF_DATE_TAGS = {0x0132: "DateTime", 0x9003: "DateTimeOriginal", 0x9004: "DateTimeDigitized",
+                  0x9011: "OffsetTimeOriginal"}
+# The time a photo was taken, in order of preference
+EXIF_DATE_PRIORITY = ("DateTimeOriginal", "DateTimeDigitized", "DateTime")
+# Dates in a FileTable are microseconds since DATE_EPOCH
+NO_DATE = -1 << 63
+NO_UTC_OFFSET = -1 << 31
+DATE_EPOCH = datetime(1970, 1, 1)
+LATENCY_BUCKETS = ((0.001, "<1ms"), (0.01, "<10ms"), (0.1, "<100ms"), (1, "<1s"), (10, "<10s"))
+WATCH_SETTLE_SECONDS = 2.0
+WATCH_BATCH_SECONDS = 5.0
+WATCH_BATCH_MAX = 2000
+WATCH_TICK = 0.5
+WATCH_IDLE_TIMEOUT = 1.0
+WATCH_RETRIES = 3
+WATCH_TOTALS = ("input_files", "organized", "fallback", "duplicates", "unsupported", "unsure", "library_matches",
+                "near_duplicates", "renamed")
+
+def get_date_taken(file_path):
+    return get_date_taken_with_source(file_path)[0]
+
+def get_date_taken_with_source(file_path):
+    file_path = Path(file_path)
+    ext = file_path.suffix.lower()
+    if ext in IMAGE_EXTENSIONS:
+        date = read_exif_date(file_path)
+        return (date, "exif") if date else (None, None)
+    if ext in VIDEO_EXTENSIONS:
+        try:
+            with open(file_path, "rb") as f:
+                date = read_mp4_creation_time(f)
+            return (date, "mp4") if date else (None, None)
+        except (OSError, ValueError):
+            pass
+    date = read_ffprobe_date(file_path)
+    if date:
+        return date, "ffprobe"
+    return None, None
+
+def read_exif_date(fp, name=None, fallback=True):
+    # fp may be a path or a binary file object holding the start of the image.
+    # The native reader is tried first and PIL only for files it cannot parse;
+    # with fallback=False those raise ValueError instead.
+    with _timed("exif", name if name is not None or hasattr(fp, "read") else fp):
+        try:
+            if hasattr(fp, "read"):
+                return exif_date(read_exif_fields(fp))
+            with open(fp, "rb") as f:
+                return exif_date(read_exif_fields(f))
+        except ValueError as e:
+            if not fallback:
+                raise
+            _count_swallowed("exif-native", e)
+        except OSError as e:
+            _count_swallowed("exif", e)
+            return None
+        try:
+            from PIL import Image
+            if hasattr(fp, "seek"):
+                fp.seek(0)
+            exif = Image.open(fp).getexif()
+            tags = {**exif, **exif.get_ifd(EXIF_IFD_POINTER)}
+            return exif_date({EXIF_DATE_TAGS[tag]: value for tag, value in tags.items()
+                              if tag in EXIF_DATE_TAGS and isinstance(value, str)})
+        except Exception as e:
+            _count_swallowed("exif", e)
+    return None
+
+def exif_date(fields):
+    # The camera's local wall-clock time; OffsetTimeOriginal is left to callers
+    # that need an absolute time, so folders follow the date the photo shows
+    for name in EXIF_DATE_PRIORITY:
+        try:
+            return datetime.strptime(fields.get(name, "")[:19], "%Y:%m:%d %H:%M:%S")
+        except ValueError:
+            continue  # missing, or blanked out as "0000:00:00 00:00:00"
+    return None
+
+def read_exif_fields(f):
+    """Reads the date tags from the EXIF block of a JPEG, PNG or HEIF file.
+
+    Only the container headers and the EXIF directories are read, so a
+    typical file costs a few KB of reads and no image decoding. Returns
+    {tag name: text} for whichever of DateTimeOriginal, OffsetTimeOriginal,
+    DateTimeDigitized and DateTime are present ({} without EXIF). Raises
+    ValueError for other formats and for damaged or truncated files.
+    """
+    try:
+        f.seek(0)
+        head = f.read(12)
+        if head[:2] == b"\xff\xd8":
+            location = _find_jpeg_exif(f)
+        elif head[:8] == PNG_SIGNATURE:
+            location = _find_png_exif(f)
+        elif head[4:8] == b"ftyp":
+            location = _find_heif_exif(f)
+        else:
+            raise ValueError("Not a JPEG, PNG or HEIF file")
+        if location is None:
+            return {}
+        return _read_tiff_dates(f, *location)
+    except (struct.error, IndexError) as e:
+        raise ValueError(f"Damaged EXIF data: {e}")
+
+def _find_jpeg_exif(f):
+    # Returns (start, end) of the TIFF data in the APP1 Exif segment, or None.
+    # Only segment headers are read until the image data starts.
+    pos = 2
+    while True:
+        f.seek(pos)
+        header = f.read(4)
+        if len(header) < 4 or header[0] != 0xFF:
+            raise ValueError("Truncated or damaged JPEG")
+        marker = header[1]
+        if marker == 0xFF:
+            pos += 1  # fill byte
+            continue
+        if marker in (0xD9, 0xDA):
+            return None
+        length = struct.unpack(">H", header[2:])[0]
+        if marker == 0xE1 and f.read(6) == b"Exif\0\0":
+            return pos + 10, pos + 2 + length
+        pos += 2 + length
+
+def _find_png_exif(f):
+    # Returns (start, end) of the eXIf chunk's TIFF data, or None. Chunks are
+    # skipped by seeking, and the search stops at the image data.
+    pos = len(PNG_SIGNATURE)
+    while True:
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8:
+            raise ValueError("Truncated PNG")
+        length, kind = struct.unpack(">I4s", header)
+        if kind == b"eXIf":
+            start = pos + 8
+            if f.read(6) == b"Exif\0\0":
+                start += 6
+            return start, pos + 8 + length
+        if kind in (b"IDAT", b"IEND"):
+            return None
+        pos += 12 + length
+
+def _find_heif_exif(f):
+    # Returns (start, end) of the TIFF data of the HEIF Exif item, found
+    # through meta/iinf (item types) and meta/iloc (item locations), or None
+    end = f.seek(0, os.SEEK_END)
+    meta = next(((start, box_end) for box_type, start, box_end in iter_mp4_boxes(f, 0, end)
+                 if box_type == b"meta"), None)
+    if meta is None:
+        raise ValueError("No meta box")
+    exif_items = set()
+    locations = {}
+    idat = None
+    for box_type, start, box_end in iter_mp4_boxes(f, meta[0] + 4, meta[1]):  # meta is a full box
+        if box_type == b"iinf":
+            exif_items = _heif_exif_items(f, start, box_end)
+        elif box_type == b"iloc":
+            f.seek(start)
+            locations = _heif_locations(f.read(box_end - start))
+        elif box_type == b"idat":
+            idat = start
+    for item in sorted(exif_items):
+        method, extents = locations.get(item, (0, []))
+        if len(extents) != 1 or method not in (0, 1) or (method == 1 and idat is None):
+            raise ValueError("Unsupported Exif item layout")
+        offset, length = extents[0]
+        if method == 1:
+            offset += idat
+        f.seek(offset)
+        header = f.read(4)
+        if len(header) < 4:
+            raise ValueError("Truncated Exif item")
+        start = offset + 4 + struct.unpack(">I", header)[0]
+        f.seek(start)
+        if f.read(6) == b"Exif\0\0":
+            start += 6
+        return start, offset + length
+    return None
+
+def _heif_exif_items(f, start, end):
+    f.seek(start)
+    version = f.read(4)[0]
+    items = set()
+    for box_type, box_start, _ in iter_mp4_boxes(f, start + 4 + (2 if version == 0 else 4), end):
+        if box_type != b"infe":
+            continue
+        f.seek(box_start)
+        entry = f.read(14)
+        # Only version 2 and 3 entries carry an item type
+        if entry[0] == 2:
+            item_id, item_type = struct.unpack(">H2x4s", entry[4:12])
+        elif entry[0] == 3:
+            item_id, item_type = struct.unpack(">I2x4s", entry[4:14])
+        else:
+            continue
+        if item_type == b"Exif":
+            items.add(item_id)
+    return items
+
+def _heif_locations(data):
+    # Parses an iloc payload into {item id: (construction method, [(offset, length)])}
+    version = data[0]
+    offset_size, length_size = data[4] >> 4, data[4] & 15
+    base_offset_size = data[5] >> 4
+    index_size = data[5] & 15 if version in (1, 2) else 0
+    pos = 6
+
+    def take(size):
+        nonlocal pos
+        value = int.from_bytes(data[pos:pos + size], "big")
+        pos += size
+        return value
+
+    locations = {}
+    # Counts come from the file, so stop as soon as the payload runs out
+    # rather than looping over billions of zero-filled entries
+    for _ in range(take(2 if version < 2 else 4)):
+        item_id = take(2 if version < 2 else 4)
+        method = take(2) & 15 if version in (1, 2) else 0
+        take(2)  # data reference index
+        base = take(base_offset_size)
+        extents = []
+        for _ in range(take(2)):
+            take(index_size)
+            extents.append((base + take(offset_size), take(length_size)))
+            if pos > len(data):
+                raise ValueError("Truncated iloc box")
+        if pos > len(data):
+            raise ValueError("Truncated iloc box")
+        locations[item_id] = (method, extents)
+    return locations
+
+def _read_tiff_dates(f, base, end):
+    # Offsets inside TIFF data are relative to its header at base
+    def read(offset, size):
+        if offset < 0 or base + offset + size > end:
+            raise ValueError("EXIF offset out of range")
+        f.seek(base + offset)
+        data = f.read(size)
+        if len(data) < size:
+            raise ValueError("Truncated EXIF data")
+        return data
+
+    header = read(0, 8)
+    if header[:2] == b"II":
+        order = "<"
+    elif header[:2] == b"MM":
+        order = ">"
+    else:
+        raise ValueError("Bad TIFF header")
+    fields = {}
+    exif_ifd = _read_ifd_dates(read, order, struct.unpack(order + "I", header[4:])[0], fields)
+    if exif_ifd:
+        _read_ifd_dates(read, order, exif_ifd, fields)
+    return fields
+
+def _read_ifd_dates(read, order, offset, fields):
+    # Collects ASCII date tags from one IFD; returns the Exif IFD offset, if any
+    count = struct.unpack(order + "H", read(offset, 2))[0]
+    entries = read(offset + 2, count * 12)
+    pointer = None
+    for i in range(count):
+        tag, kind, n, value = struct.unpack_from(order + "HHI4s", entries, i * 12)
+        if tag == EXIF_IFD_POINTER:
+            pointer = struct.unpack(order + "I", value)[0]
+        elif tag in EXIF_DATE_TAGS and kind == 2:
+            data = value[:n] if n <= 4 else read(struct.unpack(order + "I", value)[0], n)
+            text = data.split(b"\0", 1)[0].decode("ascii", "replace").strip()
+            if text:
+                fields[EXIF_DATE_TAGS[tag]] = text
+    return pointer
+
+def read_ffprobe_date(file_path):
+    with _timed("ffprobe", file_path):
+        return _read_ffprobe_date(file_path)
+
+def _read_ffprobe_date(file_path):
+    try:
+        _count_subprocess()
+        result = subprocess.run([
+            "ffprobe",
+            "-v", "error",
+            "-select_streams", "v:0",
+            "-show_entries", "format_tags=creation_time",
+            "-of", "default=noprint_wrappers=1:nokey=0",
+            str(file_path)
+        ], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        for line in result.stdout.splitlines():
+            if "creation_time=" in line:
+                date_str = line.split("=")[1].strip()
+                return datetime.fromisoformat(date_str.replace("Z", "+00:00"))
+    except Exception as e:
+        _count_swallowed("ffprobe", e)
+    return None
+
+def iter_mp4_boxes(f, start, end):
+    # Yields (type, payload_start, box_end) for each ISO-BMFF box between start and end
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">I4s", header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - pos
+        if size < header_size:
+            raise ValueError(f"Corrupt box {box_type!r} at offset {pos}")
+        yield box_type, pos + header_size, pos + size
+        pos += size
+
+def read_mp4_creation_time(f):
+    """Reads the creation time of an MP4/MOV file without decoding it.
+
+    Only box headers are visited, so `mdat` is skipped with a seek. The
+    `moov/mvhd` creation time (what ffprobe reports as creation_time) wins;
+    the QuickTime `com.apple.quicktime.creationdate` key is used when mvhd
+    carries no time. Raises ValueError if the file is not ISO-BMFF.
+    """
+    with _timed("mp4", getattr(f, "name", None)):
+        try:
+            return _read_mp4_creation_time(f)
+        except (struct.error, IndexError) as e:
+            raise ValueError(f"Truncated MP4 box: {e}")
+
+def _read_mp4_creation_time(f):
+    end = f.seek(0, os.SEEK_END)
+    f.seek(0)
+    if f.read(8)[4:8] not in (b"ftyp", b"moov", b"mdat", b"wide", b"free", b"skip", b"pnot"):
+        raise ValueError("Not an ISO-BMFF file")
+    moov = next(((s, e) for t, s, e in iter_mp4_boxes(f, 0, end) if t == b"moov"), None)
+    if moov is None:
+        raise ValueError("No moov box")
+
+    created = None
+    apple_date = None
+    for box_type, start, box_end in iter_mp4_boxes(f, *moov):
+        if box_type == b"mvhd":
+            f.seek(start)
+            version = f.read(4)[0]
+            if version == 1:
+                created = struct.unpack(">Q", f.read(8))[0]
+            else:
+                created = struct.unpack(">I", f.read(4))[0]
+        elif box_type == b"meta":
+            apple_date = apple_date or read_quicktime_creationdate(f, start, box_end)
+        elif box_type == b"udta":
+            for child_type, child_start, child_end in iter_mp4_boxes(f, start, box_end):
+                if child_type == b"meta":
+                    apple_date = apple_date or read_quicktime_creationdate(f, child_start, child_end)
+    if created:
+        try:
+            return MP4_EPOCH + timedelta(seconds=created)
+        except OverflowError:
+            pass  # a corrupt 64-bit time; the QuickTime key may still hold one
+    return apple_date
+
+def read_quicktime_creationdate(f, start, end):
+    f.seek(start)
+    if f.read(8)[4:8] not in (b"hdlr", b"keys", b"ilst"):
+        start += 4  # ISO full box: skip version and flags
+    keys = []
+    for box_type, box_start, box_end in iter_mp4_boxes(f, start, end):
+        if box_type == b"keys":
+            f.seek(box_start + 4)
+            count = struct.unpack(">I", f.read(4))[0]
+            for _ in range(count):
+                key_size = struct.unpack(">I", f.read(4))[0]
+                if key_size < 8:
+                    raise ValueError(f"Corrupt keys entry at offset {f.tell() - 4}")
+                keys.append(f.read(key_size - 4)[4:])
+        elif box_type == b"ilst" and b"com.apple.quicktime.creationdate" in keys:
+            wanted = keys.index(b"com.apple.quicktime.creationdate") + 1
+            for item_type, item_start, item_end in iter_mp4_boxes(f, box_start, box_end):
+                if struct.unpack(">I", item_type)[0] != wanted:
+                    continue
+                for data_type, data_start, data_end in iter_mp4_boxes(f, item_start, item_end):
+                    if data_type == b"data":
+                        f.seek(data_start + 8)
+                        value = f.read(data_end - data_start - 8).decode("utf-8", "replace").strip()
+                        try:
+                            return datetime.fromisoformat(value.replace("Z", "+00:00"))
+                        except ValueError:
+                            return None
+    return None
+
+# Digest backends by name; each factory returns an object with update() and
+# hexdigest(). Digests are stored per method, so any name can be added.
+HASH_BACKENDS = {
+    "sha256": hashlib.sha256,
+    "md5": hashlib.md5,
+    "blake2b": lambda: hashlib.blake2b(digest_size=32),
+}
+if xxhash is not None:
+    # Not cryptographic, but several times faster; fine for finding duplicates
+    HASH_BACKENDS["xxh3_128"] = xxhash.xxh3_128
+
+def register_hash_method(name, factory):
+    HASH_BACKENDS[name] = factory
+
+def hash_methods():
+    return list(HASH_BACKENDS)
+
+def new_hasher(method):
+    try:
+        return HASH_BACKENDS[method]()
+    except KeyError:
+        raise ValueError(f"Unknown hash method: {method}") from None
+
+_buffers = threading.local()
+
+def _read_buffer():
+    # One buffer per worker thread, reused for every file it hashes
+    buffer = getattr(_buffers, "buffer", None)
+    if buffer is None:
+        buffer = _buffers.buffer = bytearray(HASH_READ_SIZE)
+    return buffer
+
+def _hash_rest(f, h, timer):
+    # Large readinto() calls into a reused buffer; hashlib releases the GIL
+    # while digesting, so worker threads hash in parallel
+    buffer = _read_buffer()
+    view = memoryview(buffer)
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            pass
+    while n := f.readinto(buffer):
+        h.update(view[:n])
+        timer.bytes_read += n
+
+def hash_file(path, method="sha256"):
+    h = new_hasher(method)
+    with _timed("hash", path) as timer, open(path, "rb", buffering=0) as f:
+        _hash_rest(f, h, timer)
+    return h.hexdigest()
+
+def hash_file_partial(path, size, method="sha256", block_size=PARTIAL_BLOCK_SIZE):
+    # Digest of the first and last block only; used to split files that share a size
+    h = new_hasher(method)
+    with _timed("hash_partial", path) as timer, open(path, "rb") as f:
+        block = f.read(block_size)
+        if size > block_size:
+            f.seek(max(size - block_size, block_size))
+            block += f.read(block_size)
+        h.update(block)
+        timer.bytes_read += len(block)
+    return h.hexdigest()
+
+def _unread_bytes(size):
+    # Bytes of a file read_file_once never reads when it takes the partial
+    # digest: everything between the buffered head (plus the byte read to
+    # find the end) and the tail block. Smaller files are read whole.
+    return max(0, size - PARTIAL_BLOCK_SIZE - HEAD_READ_SIZE - 1)
+
+def perceptual_hash(path):
+    """64-bit difference hash (dHash) of an image as 16 hex digits, or None.
+
+    The image is decoded at reduced size (JPEG draft mode), turned upright,
+    shrunk to 9x8 greyscale and each pixel compared with its right-hand
+    neighbour, so re-encoded, resized or re-saved copies hash alike.
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+    with _timed("phash", path):
+        try:
+            with Image.open(path) as image:
+                image.draft("L", (DHASH_SIZE * 8, DHASH_SIZE * 8))
+                image = ImageOps.exif_transpose(image).convert("L").resize(
+                    (DHASH_SIZE + 1, DHASH_SIZE), Image.BILINEAR)
+                pixels = image.tobytes()
+        except Exception as e:
+            _count_swallowed("phash", e)
+            return None
+    width = DHASH_SIZE + 1
+    if np is not None:
+        grid = np.frombuffer(pixels, dtype=np.uint8).reshape(DHASH_SIZE, width)
+        bits = np.packbits(grid[:, 1:] > grid[:, :-1])
+        return bits.tobytes().hex()
+    value = 0
+    for row in range(DHASH_SIZE):
+        for col in range(DHASH_SIZE):
+            left, right = pixels[row * width + col], pixels[row * width + col + 1]
+            value = (value << 1) | (right > left)
+    return f"{value:0{DHASH_SIZE * DHASH_SIZE // 4}x}"
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+class HammingIndex:
+    """BK-tree over 64-bit perceptual hashes.
+
+    Each child edge is labelled with its Hamming distance from the parent, so
+    by the triangle inequality a search within threshold only descends edges
+    labelled parent_distance +/- threshold instead of visiting every hash.
+    """
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value, item):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def nearest(self, value, threshold):
+        # Returns (distance, item) of the closest hash within threshold, or None
+        best = None
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(value, node[0])
+            if distance <= threshold and (best is None or distance < best[0]):
+                best = (distance, node[1][0])
+                threshold = distance
+            for edge, child in node[2].items():
+                if distance - threshold <= edge <= distance + threshold:
+                    stack.append(child)
+        return best
+
+class NearDuplicateFinder:
+    """Matches images placed in one run against earlier ones by perceptual hash."""
+
+    def __init__(self, mode, threshold=NEAR_DUPLICATE_THRESHOLD):
+        self.mode = mode
+        self.threshold = threshold
+        self.index = HammingIndex()
+
+    def match(self, phash):
+        if not phash:
+            return None
+        return self.index.nearest(int(phash, 16), self.threshold)
+
+    def remember(self, phash, target):
+        if phash:
+            self.index.add(int(phash, 16), target)
+
+def read_file_once(path, size, method="sha256", want_date=True, want_partial=False, want_full=False):
+    """Reads the head of a file once and derives everything it can from those bytes.
+
+    Returns (date, date_source, partial_digest, full_digest). The date is parsed
+    from the buffered head (or the MP4 box headers), the partial digest matches
+    hash_file_partial and the full digest is filled in when the whole file
+    fitted in the buffer, or with want_full by hashing on past the head in the
+    same pass. Containers that still need ffprobe are returned with the
+    PROBE_PENDING source so callers can batch them.
+    """
+    path = Path(path)
+    partial = full = None
+    with open(path, "rb") as f:
+        with _timed("read", path) as timer:
+            head = f.read(HEAD_READ_SIZE)
+            extra = f.read(1) if len(head) == HEAD_READ_SIZE else b""
+            complete = not extra
+            timer.bytes_read += len(head) + len(extra)
+            if want_partial:
+                h = new_hasher(method)
+                h.update(head[:PARTIAL_BLOCK_SIZE])
+                if size > PARTIAL_BLOCK_SIZE:
+                    start = max(size - PARTIAL_BLOCK_SIZE, PARTIAL_BLOCK_SIZE)
+                    if complete:
+                        h.update(head[start:start + PARTIAL_BLOCK_SIZE])
+                    else:
+                        f.seek(start)
+                        tail = f.read(PARTIAL_BLOCK_SIZE)
+                        timer.bytes_read += len(tail)
+                        h.update(tail)
+                partial = h.hexdigest()
+        if complete or want_full:
+            h = new_hasher(method)
+            h.update(head)
+            if not complete:
+                # Hash on from the end of the head instead of reopening the file
+                with _timed("hash", path) as timer:
+                    f.seek(len(head))
+                    _hash_rest(f, h, timer)
+            full = h.hexdigest()
+
+        date = source = None
+        ext = path.suffix.lower()
+        if want_date and ext in VIDEO_EXTENSIONS:
+            try:
+                date = read_mp4_creation_time(f)
+                source = "mp4" if date else None
+            except ValueError:
+                source = PROBE_PENDING
+
+    if want_date:
+        if ext in IMAGE_EXTENSIONS:
+            try:
+                date = read_exif_date(io.BytesIO(head), path, fallback=complete)
+            except ValueError:
+                # EXIF may sit beyond the buffered head (e.g. some HEIC layouts)
+                date = read_exif_date(path)
+            if date:
+                source = "exif"
+        elif ext not in VIDEO_EXTENSIONS:
+            source = PROBE_PENDING
+    return date, source, partial, full
+
+class MetadataCache:
+    """Persistent per-file cache of extracted dates and digests.
+
+    Entries are keyed by path and only trusted while (device, inode, size,
+    mtime_ns) still match the file on disk; anything else is evicted.
+    """
+
+    def __init__(self, db_path):
+        # The cache lives in the output folder, which a first run has yet to create
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self.lock = threading.RLock()
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER,
+                date TEXT, date_source TEXT
+            );
+            CREATE TABLE IF NOT EXISTS digests (
+                path TEXT, method TEXT, digest TEXT,
+                PRIMARY KEY (path, method)
+            );
+            CREATE TABLE IF NOT EXISTS ingested (
+                path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER
+            );
+        """)
+        self.hits = 0
+        self.misses = 0
+        self._validated = set()
+
+    def _validate(self, path, st):
+        # Returns True when the stored row still describes the file on disk
+        if path in self._validated:
+            return True
+        stamp = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        row = self.conn.execute(
+            "SELECT dev, ino, size, mtime_ns FROM files WHERE path = ?", (path,)).fetchone()
+        if row == stamp:
+            self._validated.add(path)
+            return True
+        self.forget(path)
+        self.conn.execute(
+            "INSERT INTO files (path, dev, ino, size, mtime_ns) VALUES (?, ?, ?, ?, ?)", (path, *stamp))
+        self._validated.add(path)
+        return False
+
+    def get_date(self, path, st):
+        with self.lock:
+            path = str(path)
+            if self._validate(path, st):
+                row = self.conn.execute(
+                    "SELECT date, date_source FROM files WHERE path = ?", (path,)).fetchone()
+                if row and row[1] is not None:
+                    self.hits += 1
+                    date = datetime.fromisoformat(row[0]) if row[0] else None
+                    return True, date, (row[1] if row[1] != "none" else None)
+            self.misses += 1
+            return False, None, None
+
+    def put_date(self, path, st, date, source):
+        with self.lock:
+            path = str(path)
+            self._validate(path, st)
+            self.conn.execute(
+                "UPDATE files SET date = ?, date_source = ? WHERE path = ?",
+                (date.isoformat() if date else None, source or "none", path))
+
+    def get_digest(self, path, st, method):
+        with self.lock:
+            path = str(path)
+            if self._validate(path, st):
+                row = self.conn.execute(
+                    "SELECT digest FROM digests WHERE path = ? AND method = ?", (path, method)).fetchone()
+                if row:
+                    self.hits += 1
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def put_digest(self, path, st, method, digest):
+        with self.lock:
+            path = str(path)
+            self._validate(path, st)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO digests (path, method, digest) VALUES (?, ?, ?)", (path, method, digest))
+
+    def forget(self, path):
+        with self.lock:
+            path = str(path)
+            self._validated.discard(path)
+            self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+            self.conn.execute("DELETE FROM digests WHERE path = ?", (path,))
+
+    def was_ingested(self, path, st):
+        # True if watch mode already organised this version of the file
+        with self.lock:
+            row = self.conn.execute("SELECT size, mtime_ns FROM ingested WHERE path = ?", (str(path),)).fetchone()
+            return row == (st.st_size, st.st_mtime_ns)
+
+    def mark_ingested(self, path, st):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO ingested (path, size, mtime_ns) VALUES (?, ?, ?)",
+                              (str(path), st.st_size, st.st_mtime_ns))
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+def run_in_pool(func, items, workers, progress=None):
+    # Runs func over items on a thread pool; results keep the order of items
+    results = [None] * len(items)
+    if workers <= 1:
+        for i, item in enumerate(items):
+            results[i] = func(item)
+            if progress:
+                progress((i + 1) / len(items))
+        return results
+    # Only POOL_TASKS_PER_WORKER tasks per worker are submitted ahead, so a
+    # million items never means a million pending futures
+    pending = {}
+    queued = enumerate(items)
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            for i, item in queued:
+                pending[executor.submit(func, item)] = i
+                if len(pending) >= workers * POOL_TASKS_PER_WORKER:
+                    break
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                results[pending.pop(future)] = future.result()
+                done += 1
+                if progress:
+                    progress(done / len(items))
+    return results
+
+class LibraryIndex:
+    """Content index of an organised output library.
+
+    Records every supported file under the library root (except duplicates/)
+    with its size and, once known, its digest, so new imports are checked
+    against the library without rehashing it. Files filed under unsure/ or
+    near_duplicates/ are included, so importing them again finds them too.
+    Library files whose digest is not known yet are hashed the first time an
+    import matches their size.
+    Folder mtimes are stored too, so refresh() only relists changed folders.
+    Files placed by the organiser also keep the date they were filed under
+    (taken), which the Folder Naming Assistant uses to group folders into
+    events.
+    """
+
+    def __init__(self, root, db_path):
+        # Paths are stored in full, so the same library opened through a
+        # relative path or another working directory shares its rows
+        self.root = Path(root).resolve()
+        self.conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self.lock = threading.RLock()
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY, dir TEXT, size INTEGER, mtime_ns INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS digests (
+                path TEXT, method TEXT, digest TEXT,
+                PRIMARY KEY (path, method)
+            );
+            CREATE TABLE IF NOT EXISTS dirs (
+                path TEXT PRIMARY KEY, parent TEXT, mtime_ns INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS files_size ON files (size);
+            CREATE INDEX IF NOT EXISTS files_dir ON files (dir);
+            CREATE INDEX IF NOT EXISTS digests_digest ON digests (method, digest);
+        """)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(files)")}
+        if "taken" not in columns:
+            self.conn.execute("ALTER TABLE files ADD COLUMN taken TEXT")
+        stored = self.conn.execute("SELECT path FROM dirs ORDER BY length(path) LIMIT 1").fetchone()
+        if stored is not None and stored[0] != str(self.root):
+            self._rebase(stored[0])
+        self.touched_dirs = set()
+        self.duplicates = os.path.join(str(self.root), "duplicates")
+
+    def _rebase(self, old_root):
+        # Moves rows stored under old_root (a relative path written by an
+        # older version, or the library's previous location) to self.root,
+        # keeping their digests
+        new_root, start = str(self.root), len(old_root) + 1
+        with self.conn:
+            self.conn.execute("UPDATE files SET path = ? || substr(path, ?), dir = ? || substr(dir, ?)",
+                              (new_root, start, new_root, start))
+            self.conn.execute("UPDATE digests SET path = ? || substr(path, ?)", (new_root, start))
+            self.conn.execute("UPDATE dirs SET path = ? || substr(path, ?), "
+                              "parent = CASE WHEN path = ? THEN ? ELSE ? || substr(parent, ?) END",
+                              (new_root, start, old_root, str(self.root.parent), new_root, start))
+
+    def _in_duplicates(self, path):
+        # duplicates/ only holds copies of files indexed elsewhere
+        return path == self.duplicates or path.startswith(self.duplicates + os.sep)
+
+    def refresh(self):
+        # Relists only folders whose mtime changed since the last refresh and
+        # returns (files indexed, folders relisted)
+        with self.lock:
+            known = dict(self.conn.execute("SELECT path, mtime_ns FROM dirs"))
+            children = defaultdict(list)
+            for path, parent in self.conn.execute("SELECT path, parent FROM dirs"):
+                children[parent].append(path)
+            seen = set()
+            relisted = 0
+            stack = [str(self.root)]
+            while stack:
+                folder = stack.pop()
+                try:
+                    mtime_ns = os.stat(folder).st_mtime_ns
+                except OSError:
+                    continue
+                seen.add(folder)
+                if known.get(folder) == mtime_ns:
+                    # A duplicates/ folder indexed by an older version is dropped below
+                    stack.extend(child for child in children[folder] if not self._in_duplicates(child))
+                    continue
+                relisted += 1
+                stack.extend(self._relist(folder, mtime_ns))
+            for folder in set(known) - seen:
+                self.conn.execute("DELETE FROM dirs WHERE path = ?", (folder,))
+                for (path,) in self.conn.execute("SELECT path FROM files WHERE dir = ?", (folder,)).fetchall():
+                    self._remove(path)
+            self.conn.commit()
+            count = self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            return count, relisted
+
+    def _relist(self, folder, mtime_ns):
+        subdirs = []
+        found = {}
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.path != self.duplicates:
+                        subdirs.append(entry.path)
+                elif entry.is_file(follow_symlinks=False) and Path(entry.name).suffix.lower() in SUPPORTED_EXTENSIONS:
+                    st = entry.stat(follow_symlinks=False)
+                    found[entry.path] = (st.st_size, st.st_mtime_ns)
+        existing = {path: (size, mtime) for path, size, mtime in self.conn.execute(
+            "SELECT path, size, mtime_ns FROM files WHERE dir = ?", (folder,))}
+        for path in existing.keys() - found.keys():
+            self._remove(path)
+        for path, stamp in found.items():
+            if existing.get(path) != stamp:
+                self._remove(path)
+                self.conn.execute("INSERT INTO files (path, dir, size, mtime_ns) VALUES (?, ?, ?, ?)",
+                                  (path, folder, *stamp))
+        self.conn.execute("INSERT OR REPLACE INTO dirs (path, parent, mtime_ns) VALUES (?, ?, ?)",
+                          (folder, str(Path(folder).parent), mtime_ns))
+        return subdirs
+
+    def _remove(self, path):
+        self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+        self.conn.execute("DELETE FROM digests WHERE path = ?", (path,))
+
+    def has_size(self, size):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM files WHERE size = ? LIMIT 1", (size,)).fetchone() is not None
+
+    def find(self, digest, size, method):
+        # Returns the library path holding this content, or None
+        with self.lock:
+            for (path,) in self.conn.execute(
+                    "SELECT path FROM digests WHERE method = ? AND digest = ?", (method, digest)).fetchall():
+                if self._still_valid(path):
+                    return path
+            unhashed = self.conn.execute(
+                "SELECT path FROM files WHERE size = ? AND path NOT IN "
+                "(SELECT path FROM digests WHERE method = ?)", (size, method)).fetchall()
+        for (path,) in unhashed:
+            try:
+                library_digest = hash_file(path, method=method)
+            except OSError:
+                continue
+            with self.lock:
+                self.conn.execute("INSERT OR REPLACE INTO digests (path, method, digest) VALUES (?, ?, ?)",
+                                  (path, method, library_digest))
+            if library_digest == digest:
+                return path
+        return None
+
+    def _still_valid(self, path):
+        row = self.conn.execute("SELECT size, mtime_ns FROM files WHERE path = ?", (path,)).fetchone()
+        try:
+            st = os.stat(path)
+        except OSError:
+            self._remove(path)
+            return False
+        if row is None or (st.st_size, st.st_mtime_ns) != tuple(row):
+            self._remove(path)
+            return False
+        return True
+
+    def add(self, path, size, mtime_ns, digest=None, method=None, taken=None):
+        # taken is the ISO date the file was organised by, if known
+        path = str(path)
+        if self._in_duplicates(path):
+            return
+        folder = str(Path(path).parent)
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO files (path, dir, size, mtime_ns, taken) VALUES (?, ?, ?, ?, ?)",
+                              (path, folder, size, mtime_ns, taken))
+            if digest:
+                self.conn.execute("INSERT OR REPLACE INTO digests (path, method, digest) VALUES (?, ?, ?)",
+                                  (path, method, digest))
+            self.touched_dirs.add(folder)
+
+    def commit(self):
+        # Folders we placed files into are recorded with their new mtimes so
+        # the next refresh does not relist them
+        with self.lock:
+            for folder in self.touched_dirs:
+                path = Path(folder)
+                while path != self.root and self.root in path.parents:
+                    try:
+                        self.conn.execute("INSERT OR REPLACE INTO dirs (path, parent, mtime_ns) VALUES (?, ?, ?)",
+                                          (str(path), str(path.parent), path.stat().st_mtime_ns))
+                    except OSError:
+                        pass
+                    path = path.parent
+            self.touched_dirs.clear()
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.commit()
+            self.conn.close()
+
+class PlacedIndex:
+    """Files placed by earlier watch batches, for watching without a library.
+
+    Offers the parts of LibraryIndex the batch planner uses, kept in memory
+    for the watch session: placed files are remembered by size and digest,
+    and those placed without a digest are hashed the first time an incoming
+    file has the same size.
+    """
+
+    def __init__(self):
+        self.sizes = set()
+        self.unhashed = defaultdict(list)  # size -> placed paths without a digest
+        self.digests = {}  # (size, method, digest) -> placed path
+        self.lock = threading.Lock()
+
+    def has_size(self, size):
+        with self.lock:
+            return size in self.sizes
+
+    def find(self, digest, size, method):
+        with self.lock:
+            path = self.digests.get((size, method, digest))
+            if path is not None and os.path.exists(path):
+                return path
+            unhashed = self.unhashed.pop(size, [])
+        for path in unhashed:
+            try:
+                placed_digest = hash_file(path, method=method)
+            except OSError:
+                continue
+            with self.lock:
+                self.digests[(size, method, placed_digest)] = path
+        with self.lock:
+            return self.digests.get((size, method, digest))
+
+    def add(self, path, size, mtime_ns, digest=None, method=None, taken=None):
+        with self.lock:
+            self.sizes.add(size)
+            if digest:
+                self.digests[(size, method, digest)] = str(path)
+            else:
+                self.unhashed[size].append(str(path))
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+_metrics = None  # RunMetrics of the run in progress, if any
+
+class _Timer:
+    bytes_read = 0
+    bytes_written = 0
+    detail = None
+
+@contextmanager
+def _timed(operation, file=None):
+    # Times one operation on one file for the active RunMetrics; a no-op otherwise
+    timer = _Timer()
+    metrics = _metrics
+    if metrics is None:
+        yield timer
+        return
+    started = time.perf_counter()
+    try:
+        yield timer
+    finally:
+        metrics.record(operation, time.perf_counter() - started, file, timer.bytes_read, timer.bytes_written,
+                       timer.detail)
+
+def _count_swallowed(site, error):
+    if _metrics is not None:
+        _metrics.count("swallowed_exceptions", f"{site}: {type(error).__name__}")
+
+def _count_subprocess():
+    if _metrics is not None:
+        _metrics.count("subprocesses", "ffprobe")
+
+class SamplingProfiler:
+    """Samples the stacks of every thread, including pool workers, at a fixed interval."""
+
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples = 0
+        self.self_counts = Counter()
+        self.inclusive_counts = Counter()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                self.samples += 1
+                self.self_counts[self._label(frame)] += 1
+                seen = set()
+                while frame is not None:
+                    label = self._label(frame)
+                    if label not in seen:
+                        seen.add(label)
+                        self.inclusive_counts[label] += 1
+                    frame = frame.f_back
+
+    @staticmethod
+    def _label(frame):
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_firstlineno}({code.co_name})"
+
+    def report(self):
+        return {
+            "kind": "sample", "interval_s": self.interval, "samples": self.samples,
+            "top_inclusive": [{"function": f, "samples": n} for f, n in self.inclusive_counts.most_common(PROFILE_TOP)],
+            "top_self": [{"function": f, "samples": n} for f, n in self.self_counts.most_common(PROFILE_TOP)],
+        }
+
+class RunMetrics:
+    """Where one run spent its time, written to organiser_metrics.json.
+
+    Phases are the run stages (Hashing, Organizing, ...) in wall time.
+    Operations (read, exif, mp4, ffprobe, hash, mkdir, place, ...) are timed
+    per file on whichever thread ran them, so their seconds add up across
+    workers. Each operation gets a latency histogram, and the SLOWEST_FILES
+    slowest file operations are kept with the operation that made them slow.
+    """
+
+    def __init__(self, profile=None):
+        self.lock = threading.Lock()
+        self.started = datetime.now()
+        self.started_clock = time.perf_counter()
+        self.phases = {}
+        self.phase = None
+        self.phase_started = None
+        self.operations = defaultdict(lambda: {"calls": 0, "seconds": 0.0, "bytes_read": 0, "bytes_written": 0,
+                                               "histogram": Counter()})
+        self.counts = defaultdict(Counter)
+        self.slowest = []
+        self.profile = profile
+        self.profiler = None
+
+    def activate(self):
+        global _metrics
+        _metrics = self
+        if self.profile == "cprofile":
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif self.profile == "sample":
+            self.profiler = SamplingProfiler()
+            self.profiler.start()
+
+    def deactivate(self):
+        global _metrics
+        if _metrics is self:
+            _metrics = None
+        if self.profile == "cprofile" and self.profiler is not None:
+            self.profiler.disable()
+        elif self.profile == "sample" and self.profiler is not None:
+            self.profiler.stop()
+
+    def enter_phase(self, name):
+        now = time.perf_counter()
+        with self.lock:
+            if self.phase is not None:
+                self.phases[self.phase] = self.phases.get(self.phase, 0) + now - self.phase_started
+            self.phase, self.phase_started = name, now
+
+    def phase_seconds(self):
+        now = time.perf_counter()
+        with self.lock:
+            phases = dict(self.phases)
+            if self.phase is not None:
+                phases[self.phase] = phases.get(self.phase, 0) + now - self.phase_started
+        return {name: round(seconds, 3) for name, seconds in phases.items()}
+
+    def record(self, operation, seconds, file=None, bytes_read=0, bytes_written=0, detail=None):
+        bucket = next((label for limit, label in LATENCY_BUCKETS if seconds < limit), ">=10s")
+        with self.lock:
+            stats = self.operations[operation]
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            stats["bytes_read"] += bytes_read
+            stats["bytes_written"] += bytes_written
+            stats["histogram"][bucket] += 1
+            if file is not None and (len(self.slowest) < SLOWEST_FILES or seconds > self.slowest[0][0]):
+                entry = (seconds, operation, str(file), detail or "", bytes_read + bytes_written)
+                if len(self.slowest) < SLOWEST_FILES:
+                    heapq.heappush(self.slowest, entry)
+                else:
+                    heapq.heapreplace(self.slowest, entry)
+
+    def count(self, kind, key):
+        with self.lock:
+            self.counts[kind][key] += 1
+
+    def report(self, output_path=None):
+        with self.lock:
+            operations = {
+                name: {**stats, "seconds": round(stats["seconds"], 4), "histogram": dict(stats["histogram"])}
+                for name, stats in sorted(self.operations.items())
+            }
+            slowest = sorted(self.slowest, reverse=True)
+            counts = {kind: dict(counter) for kind, counter in self.counts.items()}
+        report = {
+            "started": self.started.isoformat(timespec="seconds"),
+            "wall_seconds": round(time.perf_counter() - self.started_clock, 3),
+            "phases": self.phase_seconds(),
+            "operations": operations,
+            "bytes_read": sum(stats["bytes_read"] for stats in operations.values()),
+            "bytes_written": sum(stats["bytes_written"] for stats in operations.values()),
+            "subprocesses": sum(counts.get("subprocesses", {}).values()),
+            "swallowed_exceptions": counts.get("swallowed_exceptions", {}),
+            "slowest_files": [
+                {"file": file, "seconds": round(seconds, 4), "reason": operation + (f" ({detail})" if detail else ""),
+                 "bytes": nbytes}
+                for seconds, operation, file, detail, nbytes in slowest
+            ],
+        }
+        if self.profile == "sample" and self.profiler is not None:
+            report["profile"] = self.profiler.report()
+        elif self.profile == "cprofile" and self.profiler is not None:
+            report["profile"] = self._cprofile_report(output_path)
+        return report
+
+    def _cprofile_report(self, output_path):
+        import pstats
+        stats = pstats.Stats(self.profiler)
+        report = {"kind": "cprofile", "note": "covers the calling thread only; use sample for worker threads"}
+        if output_path is not None:
+            stats_path = Path(output_path) / PROFILE_FILENAME
+            stats.dump_stats(str(stats_path))
+            report["stats_file"] = str(stats_path)
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP]
+        report["top_cumulative"] = [
+            {"function": f"{os.path.basename(filename)}:{line}({name})", "calls": calls,
+             "total_s": round(total, 4), "cumulative_s": round(cumulative, 4)}
+            for (filename, line, name), (_, calls, total, cumulative, _) in rows
+        ]
+        return report
+
+    def write(self, output_path):
+        with open(Path(output_path) / METRICS_FILENAME, "w", encoding="utf-8") as f:
+            json.dump(self.report(output_path), f, indent=2)
+
+def format_bytes(num):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if num < 1024:
+            return f"{num:.1f} {unit}"
+        num /= 1024
+    return f"{num:.1f} TB"
+
+def _copy_reflink(src_fd, dst_fd, size):
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return True
+    except OSError:
+        return False
+
+def _copy_file_range(src_fd, dst_fd, size):
+    if not hasattr(os, "copy_file_range"):
+        return False
+    copied = 0
+    try:
+        while copied < size:
+            n = os.copy_file_range(src_fd, dst_fd, size - copied)
+            if n == 0:
+                break
+            copied += n
+    except OSError:
+        return False
+    return copied == size
+
+def _copy_sendfile(src_fd, dst_fd, size):
+    if not hasattr(os, "sendfile"):
+        return False
+    copied = 0
+    try:
+        while copied < size:
+            n = os.sendfile(dst_fd, src_fd, copied, size - copied)
+            if n == 0:
+                break
+            copied += n
+    except OSError:
+        return False
+    return copied == size
+
+def copy_file(src, dst):
+    """Copies src to dst with its timestamps and permissions, like shutil.copy2.
+
+    Tries a reflink (FICLONE) first, then in-kernel copy_file_range and
+    sendfile, and only then a buffered user-space copy. Returns the method used.
+    """
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        for method, func in (("reflink", _copy_reflink), ("copy_file_range", _copy_file_range),
+                             ("sendfile", _copy_sendfile)):
+            if func(fsrc.fileno(), fdst.fileno(), size):
+                break
+            # Undo anything a failed attempt wrote before trying the next method
+            fdst.seek(0)
+            fdst.truncate()
+            fsrc.seek(0)
+        else:
+            method = "buffered"
+            shutil.copyfileobj(fsrc, fdst, COPY_BUFFER_SIZE)
+    shutil.copystat(src, dst)
+    return method
+
+def move_file(src, dst):
+    # rename(2) when source and destination share a device, else copy and delete
+    try:
+        same_device = os.stat(src).st_dev == os.stat(Path(dst).parent).st_dev
+    except OSError:
+        same_device = False
+    if same_device:
+        try:
+            os.rename(src, dst)
+            return "rename"
+        except OSError:
+            pass
+    method = copy_file(src, dst)
+    os.unlink(src)
+    return method
+
+def link_file(src, dst):
+    # Hard link dst to src; falls back to a copy across devices
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError:
+        return copy_file(src, dst)
+
+def iter_supported_names(input_dirs, workers=DEFAULT_WORKERS, log_callback=None):
+    # Yields (folder, names) for each folder holding supported files
+    report = None
+    if log_callback is not None:
+        report = lambda stats: log_callback(f"📁 Scanned {stats.describe()}")
+    return walk_matching(input_dirs, SUPPORTED_EXTENSIONS, workers, report_callback=report)
+
+def iter_supported_files(input_dirs, workers=DEFAULT_WORKERS, log_callback=None):
+    for folder, names in iter_supported_names(input_dirs, workers, log_callback):
+        folder = Path(folder)
+        for name in names:
+            yield folder / name
+
+class Journal:
+    """Append-only record of placement operations, used to resume a run.
+
+    Every operation is written as "begin" before any file is touched and
+    "done" afterwards. Records are fsynced every JOURNAL_SYNC_EVERY writes and
+    on close; operations without a durable "done" are re-verified on resume,
+    and a target is only removed as partial if its "begin" was recorded.
+    """
+
+    def __init__(self, path, plan_id):
+        self.file = open(path, "a", encoding="utf-8")
+        self.plan_id = plan_id
+        self.unsynced = 0
+        self.lock = threading.Lock()
+        self.write({"type": "start", "time": datetime.now().isoformat()})
+
+    def write(self, record, flush=False):
+        record["plan"] = self.plan_id
+        with self.lock:
+            self.file.write(json.dumps(record) + "\n")
+            self.unsynced += 1
+            if self.unsynced >= JOURNAL_SYNC_EVERY:
+                self._sync()
+            elif flush:
+                self.file.flush()
+
+    def sync(self):
+        with self.lock:
+            self._sync()
+
+    def _sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+
+    def begin(self, seq):
+        # Flushed before the target is touched: a resume only deletes targets
+        # whose "begin" it can see, so a killed process must not lose it
+        self.write({"type": "begin", "seq": seq}, flush=True)
+
+    def done(self, seq, method):
+        self.write({"type": "done", "seq": seq, "method": method})
+
+    def close(self):
+        self.write({"type": "end", "time": datetime.now().isoformat()})
+        self.sync()
+        self.file.close()
+
+    @staticmethod
+    def progress(path, plan_id):
+        # Sequence numbers of the plan's operations that were started, and
+        # those known to be done
+        begun, done = set(), set()
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # torn final line after a crash
+                    if record.get("plan") != plan_id:
+                        continue
+                    if record.get("type") == "begin":
+                        begun.add(record["seq"])
+                    elif record.get("type") == "done":
+                        done.add(record["seq"])
+        except FileNotFoundError:
+            pass
+        return begun, done
+
+class DestinationPlanner:
+    """Chooses collision-free target names and creates target folders once.
+
+    Names already present in a target folder are read with one scandir the
+    first time the folder is used, and every planned name is claimed, so two
+    different files with the same name never share a target. Names are
+    compared case-insensitively, as on Windows and macOS.
+    """
+
+    def __init__(self):
+        self.names = {}
+        self.created = set()
+        self.pending = set()
+        self.renamed = 0
+
+    def _names(self, folder):
+        names = self.names.get(folder)
+        if names is None:
+            names = set()
+            try:
+                with os.scandir(folder) as entries:
+                    names.update(entry.name.casefold() for entry in entries)
+            except OSError:
+                pass  # not created yet
+            self.names[folder] = names
+        return names
+
+    def target(self, folder, name, digest):
+        """Returns a free path in folder for name; digest() gives the suffix used on a collision."""
+        folder = str(folder)
+        names = self._names(folder)
+        candidate = name
+        if candidate.casefold() in names:
+            stem, suffix = os.path.splitext(name)
+            candidate = f"{stem}_{digest()[:8]}{suffix}"
+            n = 1
+            while candidate.casefold() in names:
+                n += 1
+                candidate = f"{stem}_{digest()[:8]}_{n}{suffix}"
+            self.renamed += 1
+        names.add(candidate.casefold())
+        self.pending.add(folder)
+        return os.path.join(folder, candidate)
+
+    def create_dirs(self):
+        # Creates every folder planned so far that has not been created yet
+        for folder in sorted(self.pending - self.created):
+            self.ensure_dir(folder)
+        self.pending.clear()
+
+    def ensure_dir(self, folder):
+        folder = str(folder)
+        if folder not in self.created:
+            with _timed("mkdir", folder):
+                os.makedirs(folder, exist_ok=True)
+            self.created.add(folder)
+
+class OrganiserRun:
+    """State shared by the batch and streaming organisers for a single run.
+
+    Holds the counters, writes organiser_log.txt, duplicates_summary.csv and
+    the plan file as the run goes rather than at the end, and performs file
+    placement through the journal.
+    """
+
+    def __init__(self, output_path, use_copy, plan, cache, log_callback, progress_callback, stage_callback,
+                 duplicate_mode="copy", log_mode="w", library=None, profile=None, near_duplicates=None,
+                 near_threshold=NEAR_DUPLICATE_THRESHOLD, csv_mode="w", near_finder=None):
+        self.output_path = Path(output_path)
+        self.output_path.mkdir(parents=True, exist_ok=True)
+        self.metrics = RunMetrics(profile)
+        self.metrics.activate()
+        self.library = library
+        self.hash_method = None
+        self.library_matches = 0
+        self.use_copy = use_copy
+        self.plan = plan
+        self.duplicate_mode = duplicate_mode
+        self.placements = Counter()
+        self.devices = {}
+        self.lock = threading.Lock()
+        self.cache = cache
+        self.log_callback = log_callback
+        self.progress = progress_callback
+        self.stage_callback = stage_callback
+        self.log_file = open(self.output_path / "organiser_log.txt", log_mode, encoding="utf-8")
+        self.csv_mode = csv_mode
+        self.csv_file = None
+        self.csv_writer = None
+        self.near_csv_file = None
+        self.near_csv_writer = None
+        self.near_duplicates = near_duplicates
+        if near_finder is None and near_duplicates:
+            near_finder = NearDuplicateFinder(near_duplicates, near_threshold)
+        self.near_finder = near_finder
+        self.near_duplicate_count = 0
+        self.planner = DestinationPlanner()
+        self.plan_file = None
+        self.plan_id = None
+        self.journal = None
+        self.begun = set()
+        self.conflicts = set()
+        self.seq = 0
+        self.input_files = 0
+        self.organized_count = 0
+        self.fallback_organized_count = 0
+        self.duplicate_count = 0
+        self.unsupported_count = 0
+        self.unsure_count = 0
+        self.skipped_size_bytes = 0
+        self.skipped_partial_bytes = 0
+
+    def log(self, msg):
+        # Placements log from several threads at once
+        with self.lock:
+            self.log_file.write(msg + "\n")
+            self.log_callback(msg)
+
+    def stage(self, name):
+        self.metrics.enter_phase(name)
+        self.stage_callback(name)
+
+    def _open_csv(self, name, header):
+        # With csv_mode="a" rows are added to an existing summary, whose header is kept
+        f = open(self.output_path / name, self.csv_mode, newline="", encoding="utf-8")
+        writer = csv.writer(f)
+        if f.tell() == 0:
+            writer.writerow(header)
+        return f, writer
+
+    def record_duplicate(self, row):
+        if self.csv_writer is None:
+            self.csv_file, self.csv_writer = self._open_csv(
+                "duplicates_summary.csv", ["Duplicate File", "Moved To", "Original Matched File", "File Hash"])
+        self.csv_writer.writerow(row)
+        self.duplicate_count += 1
+
+    def record_near_duplicate(self, row):
+        if self.near_csv_writer is None:
+            self.near_csv_file, self.near_csv_writer = self._open_csv(
+                "near_duplicates_summary.csv", ["Near Duplicate File", "Placed At", "Similar To", "Distance"])
+        self.near_csv_writer.writerow(row)
+        self.near_duplicate_count += 1
+
+    def open_plan(self, hash_method):
+        self.hash_method = hash_method
+        self.plan_id = uuid.uuid4().hex
+        self.plan_file = open(self.output_path / PLAN_FILENAME, "w", encoding="utf-8")
+        self.plan_file.write(json.dumps({
+            "type": "header", "version": 1, "id": self.plan_id, "created": datetime.now().isoformat(),
+            "output": str(self.output_path), "use_copy": self.use_copy,
+            "duplicate_mode": self.duplicate_mode, "hash_method": hash_method,
+        }) + "\n")
+
+    def close_plan(self):
+        if self.plan_file is not None:
+            self.plan_file.close()
+            self.plan_file = None
+
+    def open_journal(self):
+        self.journal = Journal(self.output_path / JOURNAL_FILENAME, self.plan_id)
+
+    def place(self, file, st, file_hash, date, used_fallback, is_duplicate, original_path="unknown", near=None):
+        # Decides where file goes and records it in the plan; returns the
+        # operation, or None if the file was skipped. near is (distance, path)
+        # of a perceptually similar image placed earlier.
+        if file.name.lower() == "thumbs.db" or file.suffix.lower() not in SUPPORTED_EXTENSIONS:
+            self.unsupported_count += 1
+            return None
+
+        routed = near is not None and not is_duplicate and self.near_duplicates == "route"
+        if date:
+            if is_duplicate:
+                base_dir = self.output_path / "duplicates" / str(date.year) / date.strftime("%Y-%m-%d")
+            elif routed:
+                base_dir = self.output_path / "near_duplicates" / str(date.year) / date.strftime("%Y-%m-%d")
+            else:
+                base_dir = self.output_path / str(date.year) / date.strftime("%Y-%m-%d")
+        elif routed:
+            base_dir = self.output_path / "near_duplicates" / "unknown_date"
+        else:
+            base_dir = self.output_path / ("duplicates" if is_duplicate else "unsure") / "unknown_date"
+
+        if is_duplicate and self.duplicate_mode == "record":
+            action = "record"
+            target = base_dir / file.name
+        else:
+            action = "copy" if self.use_copy else "move"
+            # Only files that still have no full digest are hashed, and only on a name collision
+            digest = lambda: file_hash if isinstance(file_hash, str) else hash_file(file, self.hash_method)
+            target = self.planner.target(base_dir, file.name, digest)
+            if os.path.basename(target) != file.name:
+                self.log(f"[RENAMED] {file} -> {os.path.basename(target)} ({file.name} is already taken)")
+        self.seq += 1
+        op = {
+            "type": "op", "seq": self.seq, "action": action,
+            "link": is_duplicate and self.duplicate_mode == "hardlink",
+            "source": os.path.abspath(file), "target": str(target),
+            "digest": file_hash if isinstance(file_hash, str) else None,
+            "duplicate": is_duplicate, "duplicate_of": str(original_path) if is_duplicate else None,
+            "date": date.isoformat() if date else None, "used_fallback": used_fallback,
+            "size": st.st_size if st is not None else None,
+            "mtime_ns": st.st_mtime_ns if st is not None else None,
+            "dev": st.st_dev if st is not None else None,
+            "ino": st.st_ino if st is not None else None,
+        }
+        if near is not None and not is_duplicate:
+            op["near_duplicate_of"], op["near_distance"] = str(near[1]), near[0]
+        self.account(op)
+        if self.plan_file is not None:
+            self.plan_file.write(json.dumps(op) + "\n")
+            self.plan_file.flush()
+        return op
+
+    def account(self, op):
+        # Logs and counts an operation, whether freshly planned or replayed
+        if not op["date"]:
+            self.unsure_count += 1
+        if op["duplicate"]:
+            if op["action"] == "record":
+                self.log(f"[DUPLICATE] {op['source']} (recorded only, duplicate of {op['duplicate_of']})")
+                self.record_duplicate((op["source"], "", op["duplicate_of"], op["digest"]))
+            else:
+                self.log(f"[DUPLICATE] {op['source']} -> {op['target']} (duplicate of {op['duplicate_of']})")
+                self.record_duplicate((op["source"], op["target"], op["duplicate_of"], op["digest"]))
+        else:
+            self.log(f"[MOVE] {op['source']} -> {op['target']}")
+            if op.get("near_duplicate_of"):
+                self.log(f"[NEAR DUPLICATE] {op['source']} looks like {op['near_duplicate_of']} "
+                         f"(distance {op['near_distance']})")
+                self.record_near_duplicate((op["source"], op["target"], op["near_duplicate_of"], op["near_distance"]))
+            if op["date"] and not op["used_fallback"]:
+                self.organized_count += 1
+            elif op["date"] and op["used_fallback"]:
+                self.fallback_organized_count += 1
+
+    def execute(self, op, verify=False):
+        # Performs one planned operation. With verify=True (resuming), an
+        # operation that already completed before a crash is detected first.
+        if op["action"] == "record":
+            return
+        source, target = Path(op["source"]), Path(op["target"])
+        if verify:
+            method = self._finish_if_done(op)
+            if method == "conflict":
+                self.log(f"[CONFLICT] {target} already exists and was not written by this plan; "
+                         f"{source} was left in place")
+                with self.lock:
+                    self.conflicts.add(op["target"])
+                return
+            if method:
+                with self.lock:
+                    self.placements[method] += 1
+                self._index_placed(op)
+                return
+        try:
+            st = source.stat()
+        except OSError:
+            self.log(f"[SKIP] {source} no longer exists")
+            return
+        if op["size"] is not None and (st.st_size, st.st_mtime_ns) != (op["size"], op["mtime_ns"]):
+            self.log(f"[SKIP] {source} changed since it was planned")
+            return
+        if self.journal is not None:
+            self.journal.begin(op["seq"])
+        self.planner.ensure_dir(target.parent)
+        original = op["duplicate_of"]
+        with _timed("place", source) as timer:
+            # A conflicting original was never placed, so its target is someone else's file
+            if (op["link"] and original not in (None, "unknown") and original not in self.conflicts
+                    and Path(original).is_file()):
+                method = link_file(original, target)
+                if op["action"] == "move":
+                    os.unlink(source)
+            elif op["action"] == "copy":
+                method = copy_file(source, target)
+            else:
+                method = move_file(source, target)
+            timer.detail = method
+            # Metadata-only placements move no data
+            if method not in ("reflink", "rename", "hardlink"):
+                timer.bytes_read = timer.bytes_written = st.st_size
+        if op["action"] == "move" and self.cache is not None:
+            self.cache.forget(source)
+        if self.journal is not None:
+            self.journal.done(op["seq"], method)
+        with self.lock:
+            self.placements[method] += 1
+        self._index_placed(op)
+
+    def execute_all(self, plan_path, ops, workers, progress, total, verify=False):
+        # Places the (offset, op) pairs of plan_path concurrently within
+        # per-device limits (see io_scheduler). Only offsets are kept: each op
+        # is read back from the plan when it runs. Hard links need their
+        # original in place, so they go last. progress(fraction) counts the
+        # operations handled out of total.
+        scheduler = CopyScheduler(workers, status_callback=lambda text: self.stage_callback(f"Organizing: {text}"))
+        links = array("q")
+        counts = Counter()
+        total = max(1, total)
+        plan_file = open(plan_path, "rb")
+        plan_lock = threading.Lock()
+
+        def load(offset):
+            with plan_lock:
+                plan_file.seek(offset)
+                return json.loads(plan_file.readline())
+
+        def jobs():
+            # The scheduler stats sources itself only for plans without dev/ino
+            for offset, op in ops:
+                if op["action"] == "record":
+                    counts["records"] += 1
+                elif op["link"]:
+                    links.append(offset)
+                else:
+                    yield (offset, op["source"], op["target"], op["size"], op["action"] == "move",
+                           op.get("dev"), op.get("ino"))
+
+        def jobs_done(done):
+            counts["jobs"] = done
+            progress(min(1.0, (done + counts["records"]) / total))
+
+        with plan_file:
+            scheduler.run(jobs(), lambda offset: self.execute(load(offset), verify), jobs_done)
+            for n, offset in enumerate(links, 1):
+                self.execute(load(offset), verify)
+                progress(min(1.0, (counts["jobs"] + counts["records"] + n) / total))
+        for name, stats in scheduler.summary().items():
+            device = self.devices.setdefault(name, {"kind": stats["kind"], "bytes_read": 0, "bytes_written": 0})
+            device["bytes_read"] += stats["bytes_read"]
+            device["bytes_written"] += stats["bytes_written"]
+        if scheduler.seconds and (scheduler.bytes_read or scheduler.bytes_written):
+            self.log(f"🚚 Placed {format_bytes(sum(scheduler.bytes_written.values()))} in {scheduler.seconds:.1f}s "
+                     f"across {len(scheduler.devices)} devices.")
+
+    def _index_placed(self, op):
+        if self.library is not None and not op["duplicate"]:
+            try:
+                st = os.stat(op["target"])
+            except OSError:
+                return
+            self.library.add(op["target"], st.st_size, st.st_mtime_ns, op["digest"], self.hash_method, op["date"])
+
+    def _finish_if_done(self, op):
+        # Returns "verified" if the target already holds the finished result,
+        # removing the source of an interrupted move. Partial targets are
+        # deleted, but only those the journal shows this plan started writing:
+        # any other file at the target is a "conflict" and is left alone.
+        source, target = Path(op["source"]), Path(op["target"])
+        try:
+            target_st = os.lstat(target)
+        except OSError:
+            return None
+        if op["seq"] not in self.begun:
+            return "conflict"
+        original = op["duplicate_of"]
+        if op["link"] and original and Path(original).exists():
+            complete = os.path.samefile(target, original)
+        else:
+            complete = (target_st.st_size, target_st.st_mtime_ns) == (op["size"], op["mtime_ns"])
+        if not complete:
+            target.unlink()
+            return None
+        if op["action"] == "move" and source.exists() and not os.path.samefile(source, target):
+            source.unlink()
+        return "verified"
+
+    def close(self):
+        self.close_plan()
+        if self.journal is not None:
+            self.journal.close()
+        self.metrics.deactivate()
+        try:
+            self.metrics.write(self.output_path)
+        except OSError as e:
+            self.log(f"⚠ Could not write {METRICS_FILENAME}: {e}")
+        self.log_file.close()
+        if self.csv_file is not None:
+            self.csv_file.close()
+        if self.near_csv_file is not None:
+            self.near_csv_file.close()
+
+    def summary(self):
+        return {
+            "input_files": self.input_files,
+            "organized": self.organized_count,
+            "fallback": self.fallback_organized_count,
+            "duplicates": self.duplicate_count,
+            "unsupported": self.unsupported_count,
+            "unsure": self.unsure_count,
+            "skipped_size_bytes": self.skipped_size_bytes,
+            "skipped_partial_bytes": self.skipped_partial_bytes,
+            "placements": dict(self.placements),
+            "library_matches": self.library_matches,
+            "near_duplicates": self.near_duplicate_count,
+            "renamed": self.planner.renamed,
+            "conflicts": len(self.conflicts),
+            "devices": self.devices,
+            "stage_seconds": self.metrics.phase_seconds(),
+        }
+
+def _count_lines(path):
+    with open(path, "rb") as f:
+        return sum(block.count(b"\n") for block in iter(lambda: f.read(COPY_BUFFER_SIZE), b""))
+
+def read_plan(plan_path, offsets=False):
+    """Returns (header, iterator of operations) for a plan written by organize_files.
+
+    With offsets=True the iterator yields (offset, operation), where offset
+    is where the operation's line starts in the plan file.
+    """
+    f = open(plan_path, "rb")
+    header_line = f.readline()
+    header = json.loads(header_line)
+    if header.get("type") != "header":
+        f.close()
+        raise ValueError(f"{plan_path} is not an organiser plan")
+
+    def ops():
+        offset = len(header_line)
+        with f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    break  # torn final line from an interrupted run
+                if op.get("type") == "op":
+                    yield (offset, op) if offsets else op
+                offset += len(line)
+
+    return header, ops()
+
+def organize_files(input_dirs, output_path, use_copy=False, fallback_to_modified=True, plan=False, log_callback=None,
+                   hash_method="sha256", progress_callback=None, stage_callback=None, use_cache=True,
+                   workers=DEFAULT_WORKERS, streaming=False, queue_size=DEFAULT_QUEUE_SIZE, duplicate_mode="copy",
+                   use_library=True, profile=None, near_duplicates=None, near_threshold=NEAR_DUPLICATE_THRESHOLD):
+    """Organises input_dirs into output_path by date, separating duplicates.
+
+    The default batch mode hashes everything before placing, so each group of
+    identical files is filed under its earliest date. With streaming=True files
+    flow through bounded queues and are placed while scanning continues, using
+    memory proportional to queue_size and the dedup index.
+
+    duplicate_mode is "copy" (duplicates are copied or moved into duplicates/
+    like any other file), "hardlink" (duplicates/ entries are hard links to
+    the placed original) or "record" (duplicates are only logged and left in
+    place).
+
+    Every run writes organiser_plan.jsonl; real runs also append to
+    organiser_journal.jsonl, so an interrupted run can be finished with
+    execute_plan.
+
+    With use_library=True files already present in the output library (as
+    recorded in its LibraryIndex) are treated as duplicates of those files.
+
+    Timings per stage and per file operation are written to
+    organiser_metrics.json; profile="cprofile" or "sample" adds a profile.
+
+    near_duplicates="report" compares images by perceptual hash and logs
+    each one within near_threshold bits of an earlier image to
+    near_duplicates_summary.csv; "route" also files them under
+    near_duplicates/ instead of the date tree.
+    """
+    if profile not in (None,) + PROFILERS:
+        raise ValueError(f"Unknown profiler: {profile}")
+    if near_duplicates not in (None,) + NEAR_DUPLICATE_MODES:
+        raise ValueError(f"Unknown near-duplicate mode: {near_duplicates}")
+    if duplicate_mode not in DUPLICATE_MODES:
+        raise ValueError(f"Unknown duplicate mode: {duplicate_mode}")
+    if hash_method not in HASH_BACKENDS:
+        raise ValueError(f"Unknown hash method: {hash_method}")
+    log_callback = log_callback or (lambda msg: None)
+    progress_callback = progress_callback or (lambda value: None)
+    stage_callback = stage_callback or (lambda stage: None)
+    # The plan records absolute paths, so it can be carried out from any folder
+    output_path = Path(output_path).resolve()
+    output_path.mkdir(parents=True, exist_ok=True)
+    cache = MetadataCache(output_path / CACHE_FILENAME) if use_cache else None
+    library = LibraryIndex(output_path, output_path / LIBRARY_FILENAME) if use_library else None
+    run = OrganiserRun(output_path, use_copy, plan, cache, log_callback, progress_callback, stage_callback,
+                       duplicate_mode, library=library, profile=profile, near_duplicates=near_duplicates,
+                       near_threshold=near_threshold)
+    try:
+        if library is not None:
+            run.stage("Indexing library")
+            indexed, relisted = library.refresh()
+            run.log(f"📚 Library index: {indexed} files, {relisted} folders relisted.")
+        result = _run_organiser(run, input_dirs, fallback_to_modified, hash_method, workers, streaming, queue_size)
+    finally:
+        run.close()
+        if cache is not None:
+            cache.close()
+        if library is not None:
+            library.close()
+    return result
+
+def _run_organiser(run, input_dirs, fallback_to_modified, hash_method, workers, streaming=False,
+                   queue_size=DEFAULT_QUEUE_SIZE, files=None):
+    # Plans and carries out one run and returns its summary; files, if given,
+    # replaces scanning input_dirs (batch mode only)
+    cache = run.cache
+    run.open_plan(hash_method)
+    if not run.plan:
+        run.open_journal()
+    if streaming:
+        _organize_streaming(run, input_dirs, fallback_to_modified, hash_method, workers, queue_size)
+    else:
+        _organize_batch(run, input_dirs, fallback_to_modified, hash_method, workers, files)
+    run.log(f"⚡ Skipped hashing {format_bytes(run.skipped_size_bytes)} of files with a unique size.")
+    run.log(f"⚡ Never read {format_bytes(run.skipped_partial_bytes)} of files with a unique head/tail digest.")
+    if run.plan:
+        run.log(f"📝 Plan written to {run.output_path / PLAN_FILENAME}")
+    result = run.summary()
+    result["cache_hits"] = result["cache_misses"] = 0
+    if cache is not None:
+        result["cache_hits"], result["cache_misses"] = cache.hits, cache.misses
+        run.log(f"🗃 Cache: {cache.hits} hits, {cache.misses} misses.")
+    if run.library is not None:
+        run.log(f"📚 {run.library_matches} files were already in the library.")
+    if run.near_finder is not None:
+        run.log(f"🖼 {run.near_duplicate_count} near-duplicate images found.")
+    run.log(f"⏱ Timings written to {run.output_path / METRICS_FILENAME}")
+    return result
+
+def execute_plan(plan_path, log_callback=None, progress_callback=None, stage_callback=None, use_cache=True,
+                 use_library=True, profile=None, workers=DEFAULT_WORKERS):
+    """Carries out a plan written by organize_files without rescanning or rehashing.
+
+    Operations the journal records as done are skipped; every other operation
+    is verified first, so the same call resumes an interrupted run. Sources that
+    changed since planning are skipped and logged.
+    """
+    log_callback = log_callback or (lambda msg: None)
+    progress_callback = progress_callback or (lambda value: None)
+    stage_callback = stage_callback or (lambda stage: None)
+    header, ops = read_plan(plan_path, offsets=True)
+    output_path = Path(header["output"])
+    if not output_path.is_absolute():
+        # Older plans kept the output folder as given, relative to wherever
+        # they were made; the plan file itself is written into that folder
+        output_path = Path(plan_path).resolve().parent
+    cache = MetadataCache(output_path / CACHE_FILENAME) if use_cache else None
+    library = LibraryIndex(output_path, output_path / LIBRARY_FILENAME) if use_library else None
+    run = OrganiserRun(output_path, header["use_copy"], False, cache, log_callback, progress_callback,
+                       stage_callback, header["duplicate_mode"], log_mode="a", library=library, profile=profile)
+    run.plan_id = header["id"]
+    run.hash_method = header["hash_method"]
+    run.begun, done = Journal.progress(output_path / JOURNAL_FILENAME, run.plan_id)
+    try:
+        run.open_journal()
+        run.log(f"▶ Executing plan {plan_path} ({len(done)} operations already done)")
+        run.stage("Organizing")
+
+        def pending():
+            for offset, op in ops:
+                run.input_files += 1
+                run.account(op)
+                if op["seq"] not in done:
+                    yield offset, op
+
+        run.execute_all(plan_path, pending(), workers, lambda f: progress_callback(f * 100),
+                        _count_lines(plan_path) - 1 - len(done), verify=True)
+        progress_callback(100)
+        result = run.summary()
+    finally:
+        run.close()
+        if cache is not None:
+            cache.close()
+        if library is not None:
+            library.close()
+    return result
+
+def watch_folders(input_dirs, output_path, use_copy=False, fallback_to_modified=True, log_callback=None,
+                  hash_method="sha256", progress_callback=None, stage_callback=None, use_cache=True,
+                  workers=DEFAULT_WORKERS, duplicate_mode="copy", use_library=True, near_duplicates=None,
+                  near_threshold=NEAR_DUPLICATE_THRESHOLD, poll=False, poll_interval=WATCH_POLL_INTERVAL,
+                  settle_seconds=WATCH_SETTLE_SECONDS, batch_seconds=WATCH_BATCH_SECONDS, batch_callback=None,
+                  stop_event=None):
+    """Keeps organising files dropped into input_dirs until stop_event is set.
+
+    Changes are picked up with inotify (or by polling every poll_interval
+    seconds where inotify is unavailable, or with poll=True). A file counts
+    as arrived once its size and mtime have not changed for settle_seconds.
+    Arrived files are organised in batches, as organize_files does in batch
+    mode but without rescanning the input folders; a batch starts when no
+    other file is still settling, or batch_seconds after its first file.
+
+    The cache, the library index and the near-duplicate index stay open
+    between batches, so a file matching anything organised earlier is a
+    duplicate without rehashing the library. With use_library=False a
+    PlacedIndex of the files placed since watching started stands in for it.
+    Organised files left in the input folders (all of them in copy mode,
+    recorded duplicates and conflicts in move mode) are remembered in the
+    cache and not picked up again, even after a restart.
+    batch_callback(summary) is called after each batch. Returns the totals
+    over all batches.
+    """
+    if near_duplicates not in (None,) + NEAR_DUPLICATE_MODES:
+        raise ValueError(f"Unknown near-duplicate mode: {near_duplicates}")
+    if duplicate_mode not in DUPLICATE_MODES:
+        raise ValueError(f"Unknown duplicate mode: {duplicate_mode}")
+    if hash_method not in HASH_BACKENDS:
+        raise ValueError(f"Unknown hash method: {hash_method}")
+    log_callback = log_callback or (lambda msg: None)
+    progress_callback = progress_callback or (lambda value: None)
+    stage_callback = stage_callback or (lambda stage: None)
+    output = Path(output_path).resolve()
+    for input_dir in input_dirs:
+        input_dir = Path(input_dir).resolve()
+        if output == input_dir or input_dir in output.parents:
+            raise ValueError(f"The output folder cannot be inside the watched folder {input_dir}")
+    output.mkdir(parents=True, exist_ok=True)
+    cache = MetadataCache(output / CACHE_FILENAME) if use_cache else None
+    # Without a library, files placed by earlier batches are still duplicates
+    library = LibraryIndex(output, output / LIBRARY_FILENAME) if use_library else PlacedIndex()
+    near_finder = NearDuplicateFinder(near_duplicates, near_threshold) if near_duplicates else None
+    totals = Counter(dict.fromkeys(("batches",) + WATCH_TOTALS, 0))
+    watcher = None
+    try:
+        if use_library:
+            indexed, relisted = library.refresh()
+            log_callback(f"📚 Library index: {indexed} files, {relisted} folders relisted.")
+        watcher = open_watcher(input_dirs, SUPPORTED_EXTENSIONS, poll, poll_interval, log_callback)
+        log_callback(f"👀 Watching {', '.join(str(d) for d in input_dirs)} with {watcher.kind}.")
+        ingested = set()
+        failures = Counter()  # path -> failed batches it was in
+        pending = {}  # path -> ((size, mtime_ns), when that stamp was first seen)
+        ready = []
+        ready_since = None
+        while stop_event is None or not stop_event.is_set():
+            if pending or ready:
+                timeout = WATCH_TICK
+            else:
+                timeout = None if stop_event is None else WATCH_IDLE_TIMEOUT
+            for path in watcher.changes(timeout):
+                pending[path] = None
+            now = time.monotonic()
+            for path, seen in list(pending.items()):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    del pending[path]  # removed or renamed away before it settled
+                    continue
+                stamp = (st.st_size, st.st_mtime_ns)
+                if seen is None or seen[0] != stamp:
+                    pending[path] = (stamp, now)
+                    continue
+                if now - seen[1] < settle_seconds:
+                    continue
+                del pending[path]
+                if (path, stamp) in ingested or (cache is not None and cache.was_ingested(path, st)):
+                    continue
+                ready.append((path, st))
+                ready_since = ready_since or now
+            if not ready or (pending and now - ready_since < batch_seconds and len(ready) < WATCH_BATCH_MAX):
+                continue
+
+            batch, ready, ready_since = ready, [], None
+            totals["batches"] += 1
+            if cache is not None:
+                cache.hits = cache.misses = 0
+            run = OrganiserRun(output, use_copy, False, cache, log_callback, progress_callback, stage_callback,
+                               duplicate_mode, log_mode="a", library=library, near_duplicates=near_duplicates,
+                               csv_mode="a", near_finder=near_finder)
+            try:
+                run.log(f"📥 Batch {totals['batches']}: {len(batch)} new files.")
+                result = _run_organiser(run, input_dirs, fallback_to_modified, hash_method, workers,
+                                        files=[path for path, _ in batch])
+            except Exception as e:
+                # Keep watching. The files still there settle again and go into
+                # a later batch, up to WATCH_RETRIES times; after that they are
+                # only retried when they next change.
+                run.log(f"❌ Batch {totals['batches']} failed: {e}")
+                for path, _ in batch:
+                    failures[path] += 1
+                    if failures[path] <= WATCH_RETRIES and os.path.exists(path):
+                        pending[path] = None
+                    elif failures[path] > WATCH_RETRIES:
+                        run.log(f"[SKIP] {path} was in {WATCH_RETRIES} failed batches")
+                continue
+            finally:
+                run.close()
+            for path, st in batch:
+                failures.pop(path, None)
+                stamp = (st.st_size, st.st_mtime_ns)
+                if not use_copy:
+                    # Moved files are gone; one still here unchanged was left
+                    # in place on purpose (a recorded duplicate or a conflict)
+                    current = _stat_or_none(Path(path))
+                    if current is None or (current.st_size, current.st_mtime_ns) != stamp:
+                        continue
+                ingested.add((path, stamp))
+                if cache is not None:
+                    cache.mark_ingested(path, st)
+            if cache is not None:
+                cache.commit()
+            if library is not None:
+                library.commit()
+            totals.update({key: result[key] for key in WATCH_TOTALS})
+            result["batch"] = totals["batches"]
+            if batch_callback is not None:
+                batch_callback(result)
+    finally:
+        if watcher is not None:
+            watcher.close()
+        if cache is not None:
+            cache.close()
+        if library is not None:
+            library.close()
+    return dict(totals)
+
+def _stat_or_none(file):
+    try:
+        return file.stat()
+    except OSError:
+        return None
+
+def _cached_digest(cache, file, st, hash_method, cache_method=None, func=hash_file, *args):
+    cache_method = cache_method or hash_method
+    if cache is None or st is None:
+        return func(file, *args, method=hash_method)
+    digest = cache.get_digest(file, st, cache_method)
+    if digest is None:
+        digest = func(file, *args, method=hash_method)
+        cache.put_digest(file, st, cache_method, digest)
+    return digest
+
+def _read_date_and_digests(cache, file, st, need, hash_method):
+    # One read of the file yields the date, the partial digest and the full
+    # digest when it is needed (or the file is small enough to come for free)
+    partial = full = None
+    if st is None:
+        return get_date_taken(file), None, None, None
+    date_cached = False
+    if cache is not None:
+        date_cached, date, _ = cache.get_date(file, st)
+        if need == "partial":
+            partial = cache.get_digest(file, st, "partial-" + hash_method)
+        elif need == "full":
+            full = cache.get_digest(file, st, hash_method)
+    source = None
+    want_partial = need == "partial" and partial is None
+    want_full = need == "full" and full is None
+    if not date_cached or want_partial or want_full:
+        date_read, source, partial_read, full_read = read_file_once(
+            file, st.st_size, hash_method, want_date=not date_cached, want_partial=want_partial,
+            want_full=want_full)
+        if not date_cached:
+            date = date_read
+            if cache is not None and source != PROBE_PENDING:
+                cache.put_date(file, st, date, source)
+        if want_partial:
+            partial = partial_read
+            if cache is not None:
+                cache.put_digest(file, st, "partial-" + hash_method, partial)
+        if full is None and full_read is not None:
+            full = full_read
+            if cache is not None:
+                cache.put_digest(file, st, hash_method, full)
+    return date, source, partial, full
+
+def _cached_phash(cache, file, st):
+    # Undecodable images are cached as "" so they are not retried every run
+    if file.suffix.lower() not in IMAGE_EXTENSIONS:
+        return None
+    if cache is None or st is None:
+        return perceptual_hash(file)
+    phash = cache.get_digest(file, st, "dhash")
+    if phash is None:
+        phash = perceptual_hash(file) or ""
+        cache.put_digest(file, st, "dhash", phash)
+    return phash or None
+
+def _with_fallback(date, st, fallback_to_modified):
+    if not date and fallback_to_modified and st is not None:
+        return datetime.fromtimestamp(st.st_mtime), True
+    return date, False
+
+class FileStat:
+    """The fields of os.stat_result the organiser uses, rebuilt from a FileTable row."""
+
+    __slots__ = ("st_dev", "st_ino", "st_size", "st_mtime_ns")
+
+    def __init__(self, st_dev, st_ino, st_size, st_mtime_ns):
+        self.st_dev = st_dev
+        self.st_ino = st_ino
+        self.st_size = st_size
+        self.st_mtime_ns = st_mtime_ns
+
+    @property
+    def st_mtime(self):
+        # The same float os.stat() gives, so fallback dates do not change
+        seconds, nanoseconds = divmod(self.st_mtime_ns, 1_000_000_000)
+        return seconds + nanoseconds * 1e-9
+
+class FileTable:
+    """Per-file state of a batch run, stored by column.
+
+    A row is an index into an interned folder table plus the file name, the
+    stat fields, the date as microseconds since 1970 (with its UTC offset,
+    if it had one) and a link to the next file with the same content. Full
+    digests are raw bytes in one bytearray. A row costs a couple of hundred
+    bytes, where a Path, an os.stat_result, tuples and hex strings per file
+    cost kilobytes.
+    """
+
+    __slots__ = ("folders", "folder_ids", "folder", "names", "dev", "ino", "size", "mtime_ns", "date",
+                 "utc_offset", "next_in_group", "fallback", "hashed", "follows", "digest_size", "digests")
+
+    # Typed columns and the value of a new row
+    COLUMNS = {"dev": ("Q", 0), "ino": ("Q", 0), "size": ("q", -1), "mtime_ns": ("q", 0),
+               "date": ("q", NO_DATE), "utc_offset": ("i", NO_UTC_OFFSET), "next_in_group": ("q", -1)}
+
+    def __init__(self, digest_size):
+        for name, (typecode, _) in self.COLUMNS.items():
+            setattr(self, name, array(typecode))
+        self.folders = []
+        self.folder_ids = {}
+        self.folder = array("I")
+        self.names = []
+        self.fallback = bytearray()
+        self.hashed = bytearray()
+        self.follows = bytearray()
+        self.digest_size = digest_size
+        self.digests = bytearray()
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, folder, names):
+        # Appends a row for each name in folder
+        for name, (typecode, empty) in self.COLUMNS.items():
+            getattr(self, name).extend(array(typecode, [empty]) * len(names))
+        folder_id = self.folder_ids.setdefault(folder, len(self.folders))
+        if folder_id == len(self.folders):
+            self.folders.append(folder)
+        self.folder.extend(array("I", [folder_id]) * len(names))
+        self.names.extend(names)
+        for column in (self.fallback, self.hashed, self.follows):
+            column.extend(bytes(len(names)))
+        self.digests.extend(bytes(len(names) * self.digest_size))
+
+    def path(self, i):
+        # Joined first: Path(folder, name) would intern every stored name
+        return Path(os.path.join(self.folders[self.folder[i]], self.names[i]))
+
+    def set_stat(self, i, st):
+        if st is not None:
+            self.dev[i], self.ino[i], self.size[i], self.mtime_ns[i] = st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+    def stat(self, i):
+        # None if the file could not be stat'ed
+        if self.size[i] < 0:
+            return None
+        return FileStat(self.dev[i], self.ino[i], self.size[i], self.mtime_ns[i])
+
+    def drop(self, i):
+        # Marks a file that could not be read; it is left out of the plan
+        self.size[i] = -1
+        self.hashed[i] = 0
+
+    def set_date(self, i, date, used_fallback=False):
+        self.fallback[i] = used_fallback
+        if date is None:
+            self.date[i], self.utc_offset[i] = NO_DATE, NO_UTC_OFFSET
+            return
+        offset = date.utcoffset()
+        self.utc_offset[i] = NO_UTC_OFFSET if offset is None else offset // timedelta(seconds=1)
+        self.date[i] = (date.replace(tzinfo=None) - DATE_EPOCH) // timedelta(microseconds=1)
+
+    def get_date(self, i):
+        if self.date[i] == NO_DATE:
+            return None
+        date = DATE_EPOCH + timedelta(microseconds=self.date[i])
+        if self.utc_offset[i] != NO_UTC_OFFSET:
+            date = date.replace(tzinfo=timezone(timedelta(seconds=self.utc_offset[i])))
+        return date
+
+    def set_digest(self, i, digest):
+        raw = bytes.fromhex(digest)
+        if len(raw) != self.digest_size:
+            raise ValueError(f"Expected a {self.digest_size}-byte digest, got {digest}")
+        start = i * self.digest_size
+        self.digests[start:start + self.digest_size] = raw
+        self.hashed[i] = 1
+
+    def clear_digest(self, i):
+        self.hashed[i] = 0
+
+    def digest(self, i):
+        # Hex digest of row i, or None if it has not been hashed
+        if not self.hashed[i]:
+            return None
+        start = i * self.digest_size
+        return self.digests[start:start + self.digest_size].hex()
+
+    def link_identical(self, rows):
+        """Chains hashed rows (in ascending order) with equal digests; the first row of each chain leads it."""
+        last = {}
+        for i in rows:
+            start = i * self.digest_size
+            key = bytes(self.digests[start:start + self.digest_size])
+            previous = last.get(key)
+            if previous is not None:
+                self.next_in_group[previous] = i
+                self.follows[i] = 1
+            last[key] = i
+
+    def groups(self):
+        """Yields the rows of each group of identical files, ordered by their first row."""
+        for i in range(len(self)):
+            if not self.follows[i]:
+                group = [i]
+                while self.next_in_group[group[-1]] >= 0:
+                    group.append(self.next_in_group[group[-1]])
+                yield group
+
+def _organize_batch(run, input_dirs, fallback_to_modified, hash_method, workers, files=None):
+    _plan_batch(run, input_dirs, fallback_to_modified, hash_method, workers, files)
+    # The whole plan is on disk before the first file is touched, so an
+    # interrupted run can be resumed with execute_plan
+    if not run.plan:
+        run.planner.create_dirs()
+        plan_path = run.output_path / PLAN_FILENAME
+        _, ops = read_plan(plan_path, offsets=True)
+        run.execute_all(plan_path, ops, workers, lambda f: run.progress(50 + f * 50), run.seq)
+    run.progress(100)
+
+def _plan_batch(run, input_dirs, fallback_to_modified, hash_method, workers, files=None):
+    # Scans, dates and hashes the files and writes the plan. The per-file
+    # state lives in a FileTable that is released once the plan is written.
+    cache = run.cache
+    table = FileTable(new_hasher(hash_method).digest_size)
+    if files is None:
+        run.log("📁 Scanning files...")
+        run.stage("Scanning")
+        for folder, names in iter_supported_names(input_dirs, workers, run.log):
+            table.add(folder, names)
+    else:
+        for file in files:
+            folder, name = os.path.split(Path(file))
+            table.add(folder, [name])
+    total_files = run.input_files = len(table)
+    run.log(f"🔍 Found {total_files} supported files.")
+
+    run.stage("Hashing")
+    run_in_pool(lambda i: table.set_stat(i, _stat_or_none(table.path(i))), range(total_files), workers,
+                lambda f: run.progress(f * 10))
+    sizes = table.size
+
+    def skip(i, error):
+        # A file removed or made unreadable since it was found is left out
+        # instead of failing the whole batch
+        table.drop(i)
+        run.log(f"[SKIP] {table.path(i)} could not be read: {error}")
+
+    for i in range(total_files):
+        if sizes[i] < 0:
+            skip(i, "it no longer exists")
+
+    # Tier 1: a file with a unique size cannot have a duplicate, so it is never hashed.
+    # Tier 2: files sharing a size are split by a head+tail digest.
+    # Tier 3: only files that still collide get the full digest.
+    size_counts = Counter(size for size in sizes if size >= 0)
+    library = run.library
+    # Sizes already present in the library go straight to a full digest
+    in_library = {size for size in size_counts if library is not None and library.has_size(size)}
+    needs = [None] * total_files
+    for i, size in enumerate(sizes):
+        if size in in_library:
+            needs[i] = "full"
+        elif size >= 0 and size_counts[size] == 1:
+            run.skipped_size_bytes += size
+        elif size > 2 * PARTIAL_BLOCK_SIZE:
+            needs[i] = "partial"
+        elif size >= 0:
+            needs[i] = "full"
+    del size_counts
+
+    partials = {}
+    pending = []
+
+    def read(i):
+        file = table.path(i)
+        st = table.stat(i)
+        if st is None:
+            return
+        try:
+            date, source, partial, full = _read_date_and_digests(cache, file, st, needs[i], hash_method)
+        except OSError as e:
+            skip(i, e)
+            return
+        table.set_date(i, date)
+        if source == PROBE_PENDING:
+            pending.append(i)
+        if needs[i] == "partial":
+            partials[i] = bytes.fromhex(partial)
+        if needs[i] and full is not None:
+            table.set_digest(i, full)
+
+    run_in_pool(read, range(total_files), workers, lambda f: run.progress(10 + f * 25))
+
+    # Containers the native parsers could not read are sent to ffprobe as one batch
+    pending.sort()
+    if pending:
+        run.log(f"🎞 Probing {len(pending)} files with ffprobe...")
+    probed = run_in_pool(lambda i: read_ffprobe_date(table.path(i)), pending, workers,
+                         lambda f: run.progress(35 + f * 5))
+    for i, date in zip(pending, probed):
+        table.set_date(i, date)
+        if cache is not None:
+            cache.put_date(table.path(i), table.stat(i), date, "ffprobe" if date else None)
+    if fallback_to_modified:
+        for i in range(total_files):
+            if table.date[i] == NO_DATE and sizes[i] >= 0:
+                table.set_date(i, *_with_fallback(None, table.stat(i), fallback_to_modified))
+
+    partial_counts = Counter((sizes[i], partial) for i, partial in partials.items())
+    for i, partial in partials.items():
+        if partial_counts[(sizes[i], partial)] == 1:
+            run.skipped_partial_bytes += _unread_bytes(sizes[i])
+            table.clear_digest(i)  # a unique file is planned without its digest
+        else:
+            needs[i] = "full"
+    full_candidates = array("q", (i for i in range(total_files) if needs[i] == "full"))
+    # Emptied rather than deleted: read() above still refers to them
+    needs.clear()
+    partials.clear()
+    partial_counts.clear()
+
+    to_hash = array("q", (i for i in full_candidates if not table.hashed[i] and sizes[i] >= 0))
+
+    def hash_row(i):
+        try:
+            table.set_digest(i, _cached_digest(cache, table.path(i), table.stat(i), hash_method))
+        except OSError as e:
+            skip(i, e)
+
+    run_in_pool(hash_row, to_hash, workers, lambda f: run.progress(40 + f * 10))
+    full_candidates = array("q", (i for i in full_candidates if sizes[i] >= 0))
+    table.link_identical(full_candidates)
+
+    run.stage("Organizing")
+    # Content already in the library makes every incoming copy a duplicate.
+    # Groups are keyed by their first row.
+    library_paths = {}
+    if library is not None:
+        for i in full_candidates:
+            if sizes[i] in in_library and not table.follows[i]:
+                library_path = library.find(table.digest(i), sizes[i], hash_method)
+                if library_path:
+                    library_paths[i] = library_path
+    del full_candidates, to_hash
+    # One perceptual hash per group of identical files that will be placed
+    near_finder = run.near_finder
+    phashes = {}
+    if near_finder is not None:
+        run.log("🖼 Computing perceptual hashes...")
+        firsts = [i for i in range(total_files)
+                  if not table.follows[i] and i not in library_paths and sizes[i] >= 0]
+        hashed = run_in_pool(lambda i: _cached_phash(cache, table.path(i), table.stat(i)), firsts, workers)
+        phashes = dict(zip(firsts, hashed))
+
+    for group in table.groups():
+        first = group[0]
+        if sizes[first] < 0:
+            continue  # skipped above; never linked to other rows
+        valid_dates = [d for d in map(table.get_date, group) if d and d.year >= 1978]
+        best_date = min(valid_dates) if valid_dates else None
+        digest = table.digest(first)
+        phash = phashes.get(first)
+        near = near_finder.match(phash) if phash else None
+        original = library_paths.get(first)
+
+        for i in group:
+            is_duplicate = original is not None
+            if first in library_paths:
+                run.library_matches += 1
+            op = run.place(table.path(i), table.stat(i), digest, best_date, bool(table.fallback[i]), is_duplicate,
+                           original or "unknown", near)
+            if op is None:
+                continue
+            if not is_duplicate:
+                original = op["target"]
+                if phash and (near is None or near_finder.mode == "report"):
+                    near_finder.remember(phash, op["target"])
+    run.close_plan()
+
+def _organize_streaming(run, input_dirs, fallback_to_modified, hash_method, workers, queue_size):
+    # scan -> metadata/hash -> place, connected by bounded queues. Results are
+    # placed in scan order, so the run is deterministic for a given tree.
+    cache = run.cache
+    run.log("📁 Scanning and organizing files as they are found...")
+    run.stage("Streaming")
+    scan_queue = queue.Queue(maxsize=queue_size)
+    scanned = 0
+
+    def scan():
+        nonlocal scanned
+        try:
+            for file in iter_supported_files(input_dirs, workers):
+                scan_queue.put(file)
+                scanned += 1
+        finally:
+            scan_queue.put(None)
+
+    threading.Thread(target=scan, daemon=True).start()
+
+    # A file is only hashed once a second file of the same size turns up.
+    # size_index maps size -> (readable path, output path) of the one unhashed
+    # file of that size, or None once every file of that size has a digest.
+    library = run.library
+    library_digests = set()
+    near_finder = run.near_finder
+    sizes_seen = set()
+    sizes_lock = threading.Lock()
+    size_index = {}
+    digest_index = {}
+
+    def read(file):
+        st = _stat_or_none(file)
+        size = st.st_size if st is not None else None
+        with sizes_lock:
+            collided = size is None or size in sizes_seen
+            sizes_seen.add(size)
+        if library is not None and size is not None and library.has_size(size):
+            collided = True
+        date, source, _, full = _read_date_and_digests(cache, file, st, "full" if collided else None, hash_method)
+        if source == PROBE_PENDING:
+            date = read_ffprobe_date(file)
+            if cache is not None and st is not None:
+                cache.put_date(file, st, date, "ffprobe" if date else None)
+        if collided and full is None:
+            full = _cached_digest(cache, file, st, hash_method)
+        phash = _cached_phash(cache, file, st) if near_finder is not None else None
+        date, used_fallback = _with_fallback(date, st, fallback_to_modified)
+        return file, st, date, used_fallback, full, phash
+
+    def place_original(file, st, digest, date, used_fallback, phash):
+        near = near_finder.match(phash) if phash else None
+        op = run.place(file, st, digest, date, used_fallback, False, near=near)
+        if op is not None and not run.plan:
+            run.execute(op)
+        if op is not None and phash and (near is None or near_finder.mode == "report"):
+            near_finder.remember(phash, op["target"])
+        return op
+
+    def place(file, st, date, used_fallback, digest, phash):
+        size = st.st_size if st is not None else None
+        date = date if date and date.year >= 1978 else None
+        if digest is None and size in size_index:
+            digest = hash_file(file, method=hash_method)
+        if digest is None:
+            op = place_original(file, st, None, date, used_fallback, phash)
+            if op is not None:
+                size_index[size] = (file if run.plan else op["target"], op["target"])
+            return
+        pending = size_index.get(size)
+        if pending is not None:
+            readable, output = pending
+            digest_index.setdefault(hash_file(readable, method=hash_method), output)
+        size_index[size] = None
+        if digest not in digest_index and library is not None and library.has_size(size):
+            library_path = library.find(digest, size, hash_method)
+            if library_path:
+                digest_index[digest] = library_path
+                library_digests.add(digest)
+        if digest in library_digests:
+            run.library_matches += 1
+        if digest not in digest_index:
+            op = place_original(file, st, digest, date, used_fallback, phash)
+            if op is not None:
+                digest_index[digest] = op["target"]
+            return
+        op = run.place(file, st, digest, date, used_fallback, True, digest_index[digest])
+        if op is not None and not run.plan:
+            run.execute(op)
+
+    in_flight = deque()
+    placed = 0
+    done_scanning = False
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        while True:
+            while not done_scanning and len(in_flight) < queue_size:
+                try:
+                    file = scan_queue.get(block=not in_flight)
+                except queue.Empty:
+                    break
+                if file is None:
+                    done_scanning = True
+                    break
+                in_flight.append(executor.submit(read, file))
+            if not in_flight:
+                break
+            place(*in_flight.popleft().result())
+            placed += 1
+            run.progress(placed / max(scanned, placed) * 100)
+
+    run.input_files = placed
+    for size, pending in size_index.items():
+        if pending is not None and size is not None:
+            run.skipped_size_bytes += size
+    run.log(f"🔍 Processed {placed} supported files.")
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        description="Organise photos and videos into YYYY/YYYY-MM-DD folders. "
+                    "Progress is streamed to stdout as JSON lines, ending with a summary event.")
+    parser.add_argument("inputs", nargs="*", help="input folders to scan")
+    parser.add_argument("-o", "--output", help="output library folder")
+    parser.add_argument("--execute-plan", metavar="PLAN",
+                        help=f"carry out a {PLAN_FILENAME} written by an earlier run instead of scanning")
+    parser.add_argument("--resume", action="store_true",
+                        help="finish the interrupted run recorded in the output folder's plan and journal")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and organise files as they are dropped into the input folders; "
+                             "a batch event is printed per batch and Ctrl+C stops after the current batch")
+    parser.add_argument("--poll", action="store_true",
+                        help="with --watch, poll the folders instead of using inotify (e.g. for network shares)")
+    parser.add_argument("--settle", type=float, default=WATCH_SETTLE_SECONDS,
+                        help="with --watch, seconds a file's size and mtime must stay unchanged before it is organised")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--copy", action="store_true", help="copy files into the output folder")
+    mode.add_argument("--move", action="store_true", help="move files into the output folder")
+    parser.add_argument("--plan", action="store_true", help="only log what would happen")
+    parser.add_argument("--duplicates", dest="duplicate_mode", choices=DUPLICATE_MODES, default="copy",
+                        help="copy duplicates into duplicates/, hard link them to the original, "
+                             "or only record them in duplicates_summary.csv")
+    parser.add_argument("--hash", dest="hash_method", choices=hash_methods(), default="sha256",
+                        help="digest used to find duplicates; xxh3_128 (needs the xxhash package) is not "
+                             "cryptographic but several times faster")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--no-fallback", action="store_true", help="do not fall back to the modified date")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the persistent metadata cache")
+    parser.add_argument("--near-duplicates", choices=NEAR_DUPLICATE_MODES,
+                        help="find re-encoded or resized copies of images by perceptual hash; report them in "
+                             "near_duplicates_summary.csv or also route them to near_duplicates/")
+    parser.add_argument("--near-threshold", type=int, default=NEAR_DUPLICATE_THRESHOLD,
+                        help="largest perceptual hash distance (out of 64 bits) counted as a near duplicate")
+    parser.add_argument("--no-library", action="store_true",
+                        help="do not check incoming files against the existing output library")
+    parser.add_argument("--stream", action="store_true",
+                        help="place files while scanning continues, with bounded memory")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="files in flight between pipeline stages when streaming")
+    parser.add_argument("--profile", choices=PROFILERS,
+                        help=f"add a profile to {METRICS_FILENAME}: cprofile (calling thread, also saved as "
+                             f"{PROFILE_FILENAME}) or sample (all threads)")
+    parser.add_argument("--quiet", action="store_true", help="only print the summary event")
+    return parser
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    plan_path = args.execute_plan
+    if args.resume:
+        if not args.output:
+            parser.error("--resume needs -o/--output")
+        plan_path = str(Path(args.output) / PLAN_FILENAME)
+    elif not plan_path:
+        if not args.inputs or not args.output:
+            parser.error("input folders and -o/--output are required")
+        if not (args.copy or args.move):
+            parser.error("one of the arguments --copy --move is required")
+        if args.watch and (args.plan or args.stream):
+            parser.error("--watch cannot be combined with --plan or --stream")
+
+    def emit(event, **fields):
+        print(json.dumps({"event": event, **fields}, ensure_ascii=False), flush=True)
+
+    last_percent = -1
+
+    def progress(value):
+        nonlocal last_percent
+        if int(value) != last_percent:
+            last_percent = int(value)
+            emit("progress", percent=last_percent)
+
+    callbacks = {}
+    if not args.quiet:
+        callbacks = {
+            "log_callback": lambda msg: emit("log", message=msg),
+            "progress_callback": progress,
+            "stage_callback": lambda stage: emit("stage", stage=stage),
+        }
+    try:
+        if args.watch and not plan_path:
+            # Ctrl+C or SIGTERM lets the batch in progress finish first
+            stop = threading.Event()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(sig, lambda signum, frame: stop.set())
+            result = watch_folders(
+                args.inputs, args.output, use_copy=args.copy, fallback_to_modified=not args.no_fallback,
+                hash_method=args.hash_method, use_cache=not args.no_cache, workers=max(1, args.workers),
+                duplicate_mode=args.duplicate_mode, use_library=not args.no_library,
+                near_duplicates=args.near_duplicates, near_threshold=args.near_threshold, poll=args.poll,
+                settle_seconds=max(0.0, args.settle), batch_callback=lambda summary: emit("batch", **summary),
+                stop_event=stop, **callbacks)
+        elif plan_path:
+            result = execute_plan(plan_path, use_cache=not args.no_cache, use_library=not args.no_library,
+                                  profile=args.profile, workers=max(1, args.workers), **callbacks)
+        else:
+            result = organize_files(
+                args.inputs, args.output, use_copy=args.copy, fallback_to_modified=not args.no_fallback,
+                plan=args.plan, hash_method=args.hash_method, use_cache=not args.no_cache,
+                workers=max(1, args.workers), streaming=args.stream, queue_size=max(1, args.queue_size),
+                duplicate_mode=args.duplicate_mode, use_library=not args.no_library, profile=args.profile,
+                near_duplicates=args.near_duplicates, near_threshold=args.near_threshold, **callbacks)
+    except Exception as e:
+        emit("error", message=str(e))
+        return 1
+    emit("summary", **result)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,207 +1,126 @@
 #!/usr/bin/env python3
-import os
-import shutil
-import hashlib
-from datetime import datetime
-from pathlib import Path
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import threading
-import subprocess
-import csv
-from collections import defaultdict
-
-SUPPORTED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".mov", ".mp4", ".heic"}
-
-def get_date_taken(file_path):
-    file_path = Path(file_path)
-    ext = file_path.suffix.lower()
-    if ext in {".jpg", ".jpeg", ".png", ".heic"}:
-        try:
-            from PIL import Image
-            from PIL.ExifTags import TAGS
-            image = Image.open(file_path)
-            exif_data = image._getexif()
-            if exif_data:
-                for tag_id, value in exif_data.items():
-                    tag = TAGS.get(tag_id)
-                    if tag in ["DateTimeOriginal", "DateTime"]:
-                        return datetime.strptime(value, "%Y:%m:%d %H:%M:%S")
-        except Exception:
-            pass
-    try:
-        result = subprocess.run([
-            "ffprobe",
-            "-v", "error",
-            "-select_streams", "v:0",
-            "-show_entries", "format_tags=creation_time",
-            "-of", "default=noprint_wrappers=1:nokey=0",
-            str(file_path)
-        ], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-        for line in result.stdout.splitlines():
-            if "creation_time=" in line:
-                date_str = line.split("=")[1].strip()
-                return datetime.fromisoformat(date_str.replace("Z", "+00:00"))
-    except Exception:
-        pass
-    return None
-
-def hash_file(path, method="sha256"):
-    h = hashlib.sha256() if method == "sha256" else hashlib.md5()
-    with open(path, "rb") as f:
-        while chunk := f.read(8192):
-            h.update(chunk)
-    return h.hexdigest()
-
-def organize_files(input_dirs, output_path, use_copy, fallback_to_modified, plan, log_callback, hash_method, progress_callback, stage_callback):
-    seen_hashes = set()
-    hash_to_files = defaultdict(list)
-    hash_to_output_path = {}
-    duplicate_records = []
-    organized_count = 0
-    fallback_organized_count = 0
-    unsupported_count = 0
-    unsure_count = 0
-    log_lines = []
-
-    def log(msg):
-        log_lines.append(msg)
-        log_callback(msg)
-
-    log("📁 Scanning files...")
-
-    all_files = []
-    for input_dir in input_dirs:
-        for file in Path(input_dir).rglob("*.*"):
-            if file.name.lower() == "thumbs.db":
-                continue
-            if file.suffix.lower() in SUPPORTED_EXTENSIONS:
-                all_files.append(file)
-
-    total_files = len(all_files)
-    log(f"🔍 Found {total_files} supported files.")
-
-    stage_callback("Hashing")
-    for i, file in enumerate(all_files):
-        date = get_date_taken(file)
-        used_fallback = False
-        if not date and fallback_to_modified:
+import queue
+
+from photo_organiser import DEFAULT_WORKERS, DUPLICATE_MODES, execute_plan, format_bytes, hash_methods, organize_files
+
+UI_FRAME_MS = 50
+LOG_DISPLAY_LINES = 2000
+
+class UiChannel:
+    """Carries organiser updates from the worker thread to the Tk widgets.
+
+    The worker only touches a queue and a progress attribute; the Tk thread
+    drains them every UI_FRAME_MS, appending log lines in one batch and
+    keeping only the last LOG_DISPLAY_LINES on screen. The full log is in
+    organiser_log.txt.
+    """
+
+    def __init__(self, root, text_widget, progress, stage_label):
+        self.root = root
+        self.text_widget = text_widget
+        self.progress_bar = progress
+        self.stage_label = stage_label
+        self.queue = queue.SimpleQueue()
+        self.progress_value = 0
+        self.shown_progress = None
+        self.running = False
+
+    # Worker thread side
+    def log(self, msg):
+        self.queue.put(("log", msg))
+
+    def progress(self, value):
+        self.progress_value = value
+
+    def stage(self, text):
+        self.queue.put(("stage", text))
+
+    def call(self, func):
+        self.queue.put(("call", func))
+
+    def finish(self):
+        self.queue.put(("finish", None))
+
+    # Tk thread side
+    def start(self):
+        self.text_widget.delete("1.0", tk.END)
+        self.progress_bar["value"] = 0
+        self.stage_label.config(text="Stage: Starting")
+        self.running = True
+        self.root.after(UI_FRAME_MS, self.drain)
+
+    def drain(self):
+        lines = []
+        calls = []
+        while True:
             try:
-                date = datetime.fromtimestamp(file.stat().st_mtime)
-                used_fallback = True
-            except Exception:
-                pass
-
-        file_hash = hash_file(file, method=hash_method)
-        hash_to_files[file_hash].append((file, date, used_fallback))
-        progress_callback((i + 1) / total_files * 50)
-
-    stage_callback("Organizing")
-    file_index = 0
-    for file_hash, entries in hash_to_files.items():
-        valid_dates = [d for _, d, _ in entries if d and d.year >= 1978]
-        best_date = min(valid_dates) if valid_dates else None
-
-        for idx, (file, _, used_fallback) in enumerate(entries):
-            if file.name.lower() == "thumbs.db" or file.suffix.lower() not in SUPPORTED_EXTENSIONS:
-                unsupported_count += 1
-                continue
-
-            is_duplicate = file_hash in seen_hashes
-            if best_date:
-                if is_duplicate:
-                    base_dir = Path(output_path) / "duplicates" / str(best_date.year) / best_date.strftime("%Y-%m-%d")
-                else:
-                    base_dir = Path(output_path) / str(best_date.year) / best_date.strftime("%Y-%m-%d")
-            else:
-                base_dir = Path(output_path) / ("duplicates" if is_duplicate else "unsure") / "unknown_date"
-                unsure_count += 1
-
-            base_dir.mkdir(parents=True, exist_ok=True)
-            target_path = base_dir / file.name
-
-            if is_duplicate:
-                original_path = hash_to_output_path.get(file_hash, "unknown")
-                log(f"[DUPLICATE] {file} -> {target_path} (duplicate of {original_path})")
-                duplicate_records.append((str(file), str(target_path), str(original_path), file_hash))
-                if not plan:
-                    if use_copy:
-                        shutil.copy2(file, target_path)
-                    else:
-                        shutil.move(file, target_path)
-            else:
-                seen_hashes.add(file_hash)
-                hash_to_output_path[file_hash] = str(target_path)
-                log(f"[MOVE] {file} -> {target_path}")
-                if best_date and not used_fallback:
-                    organized_count += 1
-                elif best_date and used_fallback:
-                    fallback_organized_count += 1
-                if not plan:
-                    if use_copy:
-                        shutil.copy2(file, target_path)
-                    else:
-                        shutil.move(file, target_path)
-
-            file_index += 1
-            progress_callback(50 + (file_index / total_files * 50))
-
-    log_path = Path(output_path) / "organiser_log.txt"
-    with open(log_path, "w", encoding="utf-8") as f:
-        for line in log_lines:
-            f.write(line + "\n")
-
-    if duplicate_records:
-        csv_path = Path(output_path) / "duplicates_summary.csv"
-        with open(csv_path, "w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(["Duplicate File", "Moved To", "Original Matched File", "File Hash"])
-            writer.writerows(duplicate_records)
-
-    return {
-        "input_files": total_files,
-        "organized": organized_count,
-        "fallback": fallback_organized_count,
-        "duplicates": len(duplicate_records),
-        "unsupported": unsupported_count,
-        "unsure": unsure_count
-    }
-
-def run_organiser_async(params):
-    input_dirs, output_folder, use_copy, fallback, plan, hash_method, text_widget, progress, stage_label = params
-
-    def log(msg):
-        text_widget.insert(tk.END, msg + "\n")
-        text_widget.see(tk.END)
-
-    def update_progress(val):
-        progress["value"] = val
-        progress.update()
-
-    def update_stage(text):
-        stage_label.config(text=f"Stage: {text}")
-        stage_label.update()
-
-    text_widget.delete("1.0", tk.END)
-    progress["value"] = 0
-    stage_label.config(text="Stage: Starting")
-    text_widget.update()
-
-    result = organize_files(
-        input_dirs, output_folder, use_copy, fallback, plan, log, hash_method, update_progress, update_stage)
-    summary = (
+                kind, payload = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "log":
+                lines.append(payload)
+            elif kind == "stage":
+                self.stage_label.config(text=f"Stage: {payload}")
+            elif kind == "call":
+                calls.append(payload)
+            elif kind == "finish":
+                self.running = False
+        if lines:
+            self.text_widget.insert(tk.END, "\n".join(lines[-LOG_DISPLAY_LINES:]) + "\n")
+            line_count = int(self.text_widget.index("end-1c").split(".")[0])
+            if line_count > LOG_DISPLAY_LINES:
+                self.text_widget.delete("1.0", f"{line_count - LOG_DISPLAY_LINES}.0")
+            self.text_widget.see(tk.END)
+        if self.progress_value != self.shown_progress:
+            self.shown_progress = self.progress_value
+            self.progress_bar["value"] = self.progress_value
+        for func in calls:
+            func()
+        if self.running:
+            self.root.after(UI_FRAME_MS, self.drain)
+
+def format_summary(result):
+    return (
         f"✔ Done organizing {result['input_files']} files.\n"
         f"  - {result['organized']} files copied using EXIF/metadata\n"
         f"  - {result['fallback']} files copied using modified date\n"
         f"  - {result['duplicates']} duplicates sent to /duplicates\n"
         f"  - {result['unsupported']} unsupported files ignored\n"
-        f"  - {result['unsure']} files went to /unsure\n\n"
+        f"  - {result['unsure']} files went to /unsure\n"
+        f"  - {format_bytes(result['skipped_size_bytes'])} not hashed (unique size)\n"
+        f"  - {format_bytes(result['skipped_partial_bytes'])} never read (unique head/tail)\n"
+        f"  - {result.get('library_matches', 0)} files already in the library\n"
+        f"  - {result.get('renamed', 0)} files renamed to avoid a name clash\n"
+        f"  - {result.get('conflicts', 0)} planned targets taken by other files (left in place)\n"
+        f"  - {result.get('cache_hits', 0)} cache hits, {result.get('cache_misses', 0)} cache misses\n\n"
         f"Total output: {result['organized'] + result['fallback'] + result['duplicates']} organized files\n\n"
-        f"See organiser_log.txt for full details."
+        f"See organiser_log.txt for full details and organiser_metrics.json for timings."
     )
-    progress["value"] = 100
-    stage_label.config(text="Stage: Complete")
-    messagebox.showinfo("Completed", summary)
+
+def run_in_background(channel, func, *args, **kwargs):
+    try:
+        result = func(*args, log_callback=channel.log, progress_callback=channel.progress,
+                      stage_callback=channel.stage, **kwargs)
+    except Exception as e:
+        message = f"Organiser failed: {e}"
+        channel.stage("Failed")
+        channel.call(lambda: messagebox.showerror("Error", message))
+        channel.finish()
+        return
+    summary = format_summary(result)
+    channel.progress(100)
+    channel.stage("Complete")
+    channel.call(lambda: messagebox.showinfo("Completed", summary))
+    channel.finish()
+
+def run_organiser_async(params):
+    input_dirs, output_folder, use_copy, fallback, plan, hash_method, workers, streaming, duplicate_mode, channel = params
+    run_in_background(
+        channel, organize_files, input_dirs, output_folder, use_copy, fallback, plan, hash_method=hash_method,
+        workers=workers, streaming=streaming, duplicate_mode=duplicate_mode)
 
 def browse_folder(entry):
     path = filedialog.askdirectory()
@@ -237,18 +156,29 @@ def create_gui():
     plan = tk.BooleanVar()
     tk.Checkbutton(root, text="Plan Only (Preview)", variable=plan).grid(row=5, column=1, sticky="w")
 
+    streaming = tk.BooleanVar()
+    tk.Checkbutton(root, text="Stream (place files while scanning, low memory)", variable=streaming).grid(row=6, column=1, sticky="w")
+
     hash_method = tk.StringVar(value="sha256")
-    tk.Label(root, text="Hash Method:").grid(row=6, column=0, sticky="e")
-    tk.OptionMenu(root, hash_method, "sha256", "md5").grid(row=6, column=1, sticky="w")
+    tk.Label(root, text="Hash Method:").grid(row=7, column=0, sticky="e")
+    tk.OptionMenu(root, hash_method, *hash_methods()).grid(row=7, column=1, sticky="w")
+
+    duplicate_mode = tk.StringVar(value="copy")
+    tk.Label(root, text="Duplicates:").grid(row=8, column=0, sticky="e")
+    tk.OptionMenu(root, duplicate_mode, *DUPLICATE_MODES).grid(row=8, column=1, sticky="w")
+
+    workers = tk.IntVar(value=DEFAULT_WORKERS)
+    tk.Label(root, text="Workers:").grid(row=9, column=0, sticky="e")
+    tk.Spinbox(root, from_=1, to=64, width=5, textvariable=workers).grid(row=9, column=1, sticky="w")
 
     progress = ttk.Progressbar(root, length=400, mode="determinate")
-    progress.grid(row=7, column=0, columnspan=3, pady=5)
+    progress.grid(row=10, column=0, columnspan=3, pady=5)
 
     stage_label = tk.Label(root, text="Stage: Not Started")
-    stage_label.grid(row=8, column=0, columnspan=3)
+    stage_label.grid(row=11, column=0, columnspan=3)
 
     log_text = tk.Text(root, height=20, width=90)
-    log_text.grid(row=9, column=0, columnspan=3, padx=10, pady=10)
+    log_text.grid(row=12, column=0, columnspan=3, padx=10, pady=10)
 
     def start():
         input_dirs = [d for d in [input1.get(), input2.get()] if d]
@@ -256,10 +186,29 @@ def create_gui():
         if not input_dirs or not out:
             messagebox.showerror("Error", "Please select at least one input and an output folder.")
             return
-        args = (input_dirs, out, use_copy.get(), fallback.get(), plan.get(), hash_method.get(), log_text, progress, stage_label)
+        try:
+            worker_count = max(1, workers.get())
+        except tk.TclError:
+            messagebox.showerror("Error", "Workers must be a whole number.")
+            return
+        channel = UiChannel(root, log_text, progress, stage_label)
+        channel.start()
+        args = (input_dirs, out, use_copy.get(), fallback.get(), plan.get(), hash_method.get(), worker_count, streaming.get(), duplicate_mode.get(), channel)
         threading.Thread(target=run_organiser_async, args=(args,), daemon=True).start()
 
-    tk.Button(root, text="Start", command=start).grid(row=10, column=1)
+    def run_saved_plan():
+        plan_path = filedialog.askopenfilename(
+            title="Select Plan", filetypes=[("Organiser plan", "*.jsonl"), ("All files", "*.*")])
+        if not plan_path:
+            return
+        channel = UiChannel(root, log_text, progress, stage_label)
+        channel.start()
+        threading.Thread(target=run_in_background, args=(channel, execute_plan, plan_path), daemon=True).start()
+
+    button_frame = tk.Frame(root)
+    button_frame.grid(row=13, column=1)
+    tk.Button(button_frame, text="Start", command=start).pack(side=tk.LEFT, padx=5)
+    tk.Button(button_frame, text="Run Saved Plan / Resume", command=run_saved_plan).pack(side=tk.LEFT, padx=5)
     root.mainloop()
 
 if __name__ == "__main__":
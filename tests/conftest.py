@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from synthetic_corpus import generate_corpus
+
+@pytest.fixture
+def corpus(tmp_path):
+    """A small synthetic corpus: JPEGs with and without EXIF, PNGs, MP4s, MOVs and duplicates."""
+    root = tmp_path / "in"
+    generate_corpus(str(root), files=40, median_kb=8, max_mb=1, video_scale=2.0, depth=2, fanout=2, seed=7)
+    os.remove(root / "corpus.json")
+    return root
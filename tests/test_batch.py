@@ -0,0 +1,114 @@
+import os
+import random
+import shutil
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+import photo_organiser
+from photo_organiser import HEAD_READ_SIZE, organize_files, watch_folders
+from synthetic_corpus import make_jpeg
+
+def _vanish_during(monkeypatch, name, victim):
+    # Removes victim just before photo_organiser.<name> first touches it
+    real = getattr(photo_organiser, name)
+
+    def wrapper(*args, **kwargs):
+        if victim in map(str, args) and os.path.exists(victim):
+            os.remove(victim)
+        return real(*args, **kwargs)
+
+    monkeypatch.setattr(photo_organiser, name, wrapper)
+
+@pytest.mark.parametrize("stage", ["_stat_or_none", "read_file_once", "_cached_digest"])
+def test_batch_skips_a_file_that_vanishes(corpus, tmp_path, monkeypatch, stage):
+    # Two identical large files share a size and a head/tail digest, so both
+    # go through every stage, including the full hash
+    data = make_jpeg(random.Random(1), 3 * HEAD_READ_SIZE, datetime(2020, 5, 1))
+    (corpus / "large.jpg").write_bytes(data)
+    (corpus / "large_copy.jpg").write_bytes(data)
+    victim = str(corpus / "large_copy.jpg")
+    _vanish_during(monkeypatch, stage, victim)
+    log = []
+    result = organize_files([str(corpus)], str(tmp_path / "out"), use_copy=True, log_callback=log.append)
+    assert not os.path.exists(victim)
+    assert [line for line in log if line.startswith(f"[SKIP] {victim}")]
+    placed = result["organized"] + result["fallback"] + result["duplicates"] + result["unsure"]
+    assert placed == result["input_files"] - 1 == 41
+    assert os.path.exists(tmp_path / "out" / "2020" / "2020-05-01" / "large.jpg")
+
+class _Watching:
+    # Runs watch_folders in a thread until the with block ends
+    def __init__(self, inbox, output, **kwargs):
+        self.batches = []
+        self.stop = threading.Event()
+        kwargs = dict(dict(use_copy=True, poll=True, poll_interval=0.05, settle_seconds=0.1, batch_seconds=0.1,
+                           stop_event=self.stop, batch_callback=self.batches.append), **kwargs)
+        self.thread = threading.Thread(target=watch_folders, args=([str(inbox)], str(output)), kwargs=kwargs)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        self.thread.join()
+
+    def wait_for(self, count, timeout=10):
+        deadline = time.monotonic() + timeout
+        while len(self.batches) < count and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert len(self.batches) >= count
+
+def test_watch_retries_a_failed_batch(corpus, tmp_path, monkeypatch):
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    real = photo_organiser._run_organiser
+    calls = []
+
+    def fail_once(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise OSError("disk went away")
+        return real(*args, **kwargs)
+
+    monkeypatch.setattr(photo_organiser, "_run_organiser", fail_once)
+    with _Watching(inbox, tmp_path / "out") as watching:
+        shutil.copy(next(corpus.rglob("*.jpg")), inbox / "keep.jpg")
+        watching.wait_for(1)
+    batches = watching.batches
+    assert len(calls) == 2
+    assert batches and batches[0]["input_files"] == 1
+
+def test_watch_without_library_finds_files_from_earlier_batches(corpus, tmp_path):
+    inbox, output = tmp_path / "inbox", tmp_path / "out"
+    inbox.mkdir()
+    photo = next(corpus.rglob("*.jpg"))
+    with _Watching(inbox, output, use_library=False) as watching:
+        shutil.copy(photo, inbox / "first.jpg")
+        watching.wait_for(1)
+        shutil.copy(photo, inbox / "again.jpg")
+        watching.wait_for(2)
+    assert watching.batches[1]["duplicates"] == 1
+    placed = [name for folder, _, names in os.walk(output) if "duplicates" not in folder
+              for name in names if name.endswith(".jpg")]
+    assert placed == ["first.jpg"]
+
+def test_watch_remembers_recorded_duplicates_left_in_place(corpus, tmp_path):
+    inbox, output = tmp_path / "inbox", tmp_path / "out"
+    inbox.mkdir()
+    photo = next(corpus.rglob("*.jpg"))
+    shutil.copy(photo, inbox / "first.jpg")
+    shutil.copy(photo, inbox / "again.jpg")
+    with _Watching(inbox, output, use_copy=False, duplicate_mode="record") as watching:
+        watching.wait_for(1)
+    # Which copy counts as the original depends on the order files arrive in
+    assert len(os.listdir(inbox)) == 1
+    # After a restart the recorded duplicate is not organised again
+    with _Watching(inbox, output, use_copy=False, duplicate_mode="record") as watching:
+        time.sleep(1)
+    assert not watching.batches
+    with open(output / "duplicates_summary.csv", encoding="utf-8") as f:
+        assert len(f.read().splitlines()) == 2
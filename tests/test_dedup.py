@@ -0,0 +1,44 @@
+import csv
+import hashlib
+import random
+from collections import Counter
+
+import pytest
+
+from photo_organiser import HEAD_READ_SIZE, PARTIAL_BLOCK_SIZE, SUPPORTED_EXTENSIONS, organize_files
+
+def _sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_duplicates_match_a_single_pass_hash(corpus, tmp_path, streaming):
+    # The baseline: hash every file in full and group by digest
+    groups = {}
+    for path in corpus.rglob("*"):
+        if path.suffix.lower() in SUPPORTED_EXTENSIONS:
+            groups.setdefault(_sha256(path), []).append(str(path))
+    expected = Counter({digest: len(paths) - 1 for digest, paths in groups.items() if len(paths) > 1})
+    assert expected
+
+    output = tmp_path / "out"
+    result = organize_files([str(corpus)], str(output), use_copy=True, streaming=streaming)
+    with open(output / "duplicates_summary.csv", newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert result["duplicates"] == len(rows) == sum(expected.values())
+    assert Counter(row["File Hash"] for row in rows) == expected
+    for row in rows:
+        assert row["Duplicate File"] in groups[row["File Hash"]]
+        assert _sha256(row["Original Matched File"]) == row["File Hash"]
+
+@pytest.mark.parametrize("size", [2 * PARTIAL_BLOCK_SIZE + 1000, HEAD_READ_SIZE, 4 * HEAD_READ_SIZE])
+def test_unique_head_tail_counts_only_bytes_never_read(tmp_path, size):
+    rng = random.Random(size)
+    for name in ("a.jpg", "b.jpg"):
+        (tmp_path / "in").mkdir(exist_ok=True)
+        (tmp_path / "in" / name).write_bytes(rng.randbytes(size))
+    result = organize_files([str(tmp_path / "in")], str(tmp_path / "out"), use_copy=True, use_cache=False)
+    # The head (and one more byte) and the tail block are read; files that fit the head are read whole
+    unread = max(0, size - HEAD_READ_SIZE - 1 - PARTIAL_BLOCK_SIZE)
+    assert result["skipped_partial_bytes"] == 2 * unread
+    assert result["duplicates"] == 0
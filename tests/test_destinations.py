@@ -0,0 +1,51 @@
+import hashlib
+import os
+import random
+from datetime import datetime
+
+from photo_organiser import organize_files
+from synthetic_corpus import make_jpeg
+
+DAY = datetime(2020, 5, 1, 12)
+
+def _photo(path, seed, size=20000):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(make_jpeg(random.Random(seed), size, DAY))
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+def _contents(folder):
+    # File name -> content digest
+    return {name: hashlib.sha256((folder / name).read_bytes()).hexdigest() for name in os.listdir(folder)}
+
+def test_same_name_from_two_sources(tmp_path):
+    first = _photo(tmp_path / "a" / "IMG_0001.JPG", 1)
+    second = _photo(tmp_path / "b" / "IMG_0001.JPG", 2, 30000)
+    result = organize_files([str(tmp_path / "a"), str(tmp_path / "b")], str(tmp_path / "out"), use_copy=True)
+    assert result["renamed"] == 1
+    assert _contents(tmp_path / "out" / "2020" / "2020-05-01") == {
+        "IMG_0001.JPG": first, f"IMG_0001_{second[:8]}.JPG": second}
+
+def test_names_differing_only_in_case(tmp_path):
+    upper = _photo(tmp_path / "in" / "IMG.JPG", 1)
+    lower = _photo(tmp_path / "in" / "img.jpg", 2, 30000)
+    organize_files([str(tmp_path / "in")], str(tmp_path / "out"), use_copy=True)
+    placed = _contents(tmp_path / "out" / "2020" / "2020-05-01")
+    # Whichever is planned second gets the suffix, so the two never share a name on a case-insensitive disk
+    assert placed in ({"IMG.JPG": upper, f"img_{lower[:8]}.jpg": lower},
+                      {"img.jpg": lower, f"IMG_{upper[:8]}.JPG": upper})
+
+def test_name_already_in_the_target_folder(tmp_path):
+    target = tmp_path / "out" / "2020" / "2020-05-01"
+    existing = _photo(target / "IMG_0001.JPG", 1)
+    incoming = _photo(tmp_path / "in" / "IMG_0001.JPG", 2, 30000)
+    organize_files([str(tmp_path / "in")], str(tmp_path / "out"), use_copy=True, use_library=False)
+    assert _contents(target) == {"IMG_0001.JPG": existing, f"IMG_0001_{incoming[:8]}.JPG": incoming}
+
+def test_suffixed_name_taken_too(tmp_path):
+    target = tmp_path / "out" / "2020" / "2020-05-01"
+    incoming = _photo(tmp_path / "in" / "IMG_0001.JPG", 2, 30000)
+    existing = _photo(target / "IMG_0001.JPG", 1)
+    other = _photo(target / f"IMG_0001_{incoming[:8]}.JPG", 3)
+    organize_files([str(tmp_path / "in")], str(tmp_path / "out"), use_copy=True, use_library=False)
+    assert _contents(target) == {"IMG_0001.JPG": existing, f"IMG_0001_{incoming[:8]}.JPG": other,
+                                 f"IMG_0001_{incoming[:8]}_2.JPG": incoming}
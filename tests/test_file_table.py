@@ -0,0 +1,64 @@
+import hashlib
+import os
+import random
+from datetime import datetime, timedelta, timezone
+
+from photo_organiser import FileTable
+
+def _reference_groups(digests):
+    # The dict-of-lists grouping FileTable replaced: rows by digest, in row order
+    groups = {}
+    for i, digest in enumerate(digests):
+        groups.setdefault(digest if digest is not None else ("unique", i), []).append(i)
+    return sorted(groups.values())
+
+def test_file_table_matches_plain_python_state(corpus):
+    rng = random.Random(5)
+    paths = sorted(str(path) for path in corpus.rglob("*") if path.is_file())
+    table = FileTable(hashlib.sha256().digest_size)
+    by_folder = {}
+    for path in paths:
+        by_folder.setdefault(os.path.dirname(path), []).append(os.path.basename(path))
+    order = []
+    for folder, names in by_folder.items():
+        table.add(folder, names)
+        order.extend(os.path.join(folder, name) for name in names)
+    assert len(table) == len(order)
+
+    dates, digests = [], []
+    for i, path in enumerate(order):
+        assert str(table.path(i)) == path
+        st = os.stat(path)
+        table.set_stat(i, st)
+        date = rng.choice([
+            None,
+            datetime(2001, 2, 3, 4, 5, 6, 789012),
+            datetime(1969, 12, 31, 23, 59, 59),
+            datetime(2024, 2, 29, 12, tzinfo=timezone(timedelta(hours=-3, minutes=-30))),
+            datetime(2030, 1, 1, tzinfo=timezone.utc),
+        ])
+        fallback = rng.random() < 0.3
+        table.set_date(i, date, fallback)
+        dates.append((date, fallback))
+        digest = rng.choice([None, hashlib.sha256(b"a").hexdigest(), hashlib.sha256(b"b").hexdigest(),
+                             hashlib.sha256(path.encode()).hexdigest()])
+        if digest is not None:
+            table.set_digest(i, digest)
+        digests.append(digest)
+
+    for i, path in enumerate(order):
+        st, stored = os.stat(path), table.stat(i)
+        assert (stored.st_dev, stored.st_ino, stored.st_size, stored.st_mtime_ns) == (
+            st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        assert stored.st_mtime == st.st_mtime
+        date, fallback = dates[i]
+        assert table.get_date(i) == date
+        assert table.get_date(i) is None or (table.get_date(i).utcoffset() == date.utcoffset())
+        assert bool(table.fallback[i]) == fallback
+        assert table.digest(i) == digests[i]
+
+    table.link_identical([i for i, digest in enumerate(digests) if digest is not None])
+    assert sorted(table.groups()) == _reference_groups(digests)
+
+    table.drop(0)
+    assert table.stat(0) is None and table.digest(0) is None
@@ -0,0 +1,16 @@
+import os
+
+from fast_walk import walk_matching
+from folder_index import IMAGE_EXTENSIONS, FolderIndex
+
+def test_folder_index_matches_the_walker(corpus, tmp_path):
+    (corpus / "d0_0" / "UPPER.JPG").write_bytes(b"\xff\xd8\xff\xd9")
+    index = FolderIndex(str(corpus), str(tmp_path / "index.sqlite"))
+    index.refresh()
+    expected = {folder: len(names) for folder, names in walk_matching([os.path.realpath(corpus)], IMAGE_EXTENSIONS)}
+    assert {path: images for path, images, _ in index.folders()} == expected
+    # Unchanged folders are not listed again
+    assert index.refresh() == 0
+    os.remove(corpus / "d0_0" / "UPPER.JPG")
+    assert index.refresh() == 1
+    index.close()
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+import io_scheduler
+from photo_organiser import PLAN_FILENAME, execute_plan, organize_files, read_plan
+
+@pytest.fixture
+def no_block_devices(monkeypatch):
+    # As on Windows: no os.major/os.minor, and no device cached from earlier tests
+    monkeypatch.delattr(os, "major")
+    monkeypatch.delattr(os, "minor")
+    monkeypatch.setattr(io_scheduler, "_devices", {})
+
+def test_devices_are_unknown_without_os_major(tmp_path, no_block_devices):
+    info = io_scheduler.device_info(os.stat(tmp_path).st_dev)
+    assert info.kind == "unknown"
+    assert info.limit == io_scheduler.DEVICE_CONCURRENCY["unknown"]
+
+def test_placement_without_os_major(corpus, tmp_path, no_block_devices):
+    output = tmp_path / "out"
+    result = organize_files([str(corpus)], str(output), use_copy=True)
+    assert sum(result["placements"].values()) == result["input_files"] == 40
+    assert [device["kind"] for device in result["devices"].values()] == ["unknown"]
+    organize_files([str(corpus)], str(tmp_path / "planned"), use_copy=True, plan=True)
+    result = execute_plan(tmp_path / "planned" / PLAN_FILENAME)
+    assert sum(result["placements"].values()) == 40
+
+def test_jobs_are_read_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(io_scheduler, "SCHEDULE_CHUNK", 4)
+    dev = os.stat(tmp_path).st_dev
+    read = []
+    read_when_started = []
+
+    def jobs():
+        for n in range(20):
+            read.append(n)
+            yield n, str(tmp_path / f"{n}.jpg"), str(tmp_path / "out" / f"{n}.jpg"), 1, False, dev, n
+
+    finished = []
+    scheduler = io_scheduler.CopyScheduler(2)
+    scheduler.run(jobs(), lambda n: read_when_started.append(len(read)), finished.append)
+    assert read_when_started[0] <= 4
+    assert len(read_when_started) == 20
+    assert finished == list(range(1, 21))
+
+def test_planned_sources_are_not_stat_again(tmp_path, monkeypatch):
+    dev = os.stat(tmp_path).st_dev
+    sources = [str(tmp_path / f"{n}.jpg") for n in range(5)]
+    real_stat = os.stat
+    stat_calls = []
+
+    def stat(path, *args, **kwargs):
+        stat_calls.append(str(path))
+        return real_stat(path, *args, **kwargs)
+
+    monkeypatch.setattr(os, "stat", stat)
+    ran = []
+    jobs = [(n, source, str(tmp_path / "out" / f"{n}.jpg"), 1, False, dev, n) for n, source in enumerate(sources)]
+    io_scheduler.CopyScheduler(2).run(jobs, ran.append)
+    assert sorted(ran) == list(range(5))
+    assert not set(sources) & set(stat_calls)
+
+def test_plan_records_source_device_and_inode(corpus, tmp_path):
+    output = tmp_path / "out"
+    organize_files([str(corpus)], str(output), use_copy=True, plan=True)
+    _, ops = read_plan(output / PLAN_FILENAME)
+    for op in ops:
+        st = os.stat(op["source"])
+        assert (op["dev"], op["ino"]) == (st.st_dev, st.st_ino)
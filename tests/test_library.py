@@ -0,0 +1,96 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+from photo_organiser import LIBRARY_FILENAME, LibraryIndex, organize_files
+from time_index import TimeIndex
+
+def _indexed(output):
+    conn = sqlite3.connect(str(output / LIBRARY_FILENAME))
+    try:
+        return [os.path.relpath(path, output) for (path,) in conn.execute("SELECT path FROM files")]
+    finally:
+        conn.close()
+
+def _tree(folder):
+    return sorted(os.path.relpath(os.path.join(parent, name), folder)
+                  for parent, _, names in os.walk(folder) for name in names)
+
+def test_reimport_finds_files_filed_under_unsure(corpus, tmp_path):
+    output = tmp_path / "out"
+    first = organize_files([str(corpus)], str(output), use_copy=True, fallback_to_modified=False)
+    assert first["unsure"] and first["duplicates"]
+    indexed = _indexed(output)
+    assert [path for path in indexed if path.startswith("unsure" + os.sep)]
+    assert not [path for path in indexed if path.startswith("duplicates" + os.sep)]
+    unsure = _tree(output / "unsure")
+    second = organize_files([str(corpus)], str(output), use_copy=True, fallback_to_modified=False)
+    # Everything was imported before, so it all goes to duplicates/
+    assert second["library_matches"] == second["input_files"] - second["unsupported"]
+    assert second["organized"] == second["fallback"] == 0
+    assert _tree(output / "unsure") == unsure
+
+def test_refresh_drops_duplicates_indexed_before(corpus, tmp_path):
+    output = tmp_path / "out"
+    organize_files([str(corpus)], str(output), use_copy=True, fallback_to_modified=False)
+    library = LibraryIndex(output, output / LIBRARY_FILENAME)
+    library.refresh()  # the run's log files changed the root since it was indexed
+    duplicates = output / "duplicates" / "unknown_date"
+    for folder in (duplicates.parent, duplicates):
+        library.conn.execute("INSERT INTO dirs (path, parent, mtime_ns) VALUES (?, ?, ?)",
+                             (str(folder), str(folder.parent), os.stat(folder).st_mtime_ns))
+    library.conn.execute("INSERT INTO files (path, dir, size, mtime_ns) VALUES (?, ?, 1, 1)",
+                         (str(duplicates / "x.jpg"), str(duplicates)))
+    library.refresh()
+    library.close()
+    assert not [path for path in _indexed(output) if path.startswith("duplicates")]
+
+def test_time_index_skips_organiser_folders(corpus, tmp_path):
+    output = tmp_path / "out"
+    organize_files([str(corpus)], str(output), use_copy=True, near_duplicates="route")
+    near = output / "near_duplicates" / "2020" / "2020-01-01"
+    library = LibraryIndex(output, output / LIBRARY_FILENAME)
+    library.add(near / "x.jpg", 1, 1, taken="2020-01-01T12:00:00")
+    library.close()
+    spans = TimeIndex(str(output)).spans
+    assert spans
+    top = {os.path.relpath(folder, os.path.realpath(output)).split(os.sep)[0] for folder in spans}
+    assert "near_duplicates" not in top
+
+def _digests(output):
+    conn = sqlite3.connect(str(output / LIBRARY_FILENAME))
+    try:
+        return dict(conn.execute("SELECT path, digest FROM digests"))
+    finally:
+        conn.close()
+
+def test_library_opened_through_relative_path(corpus, tmp_path, monkeypatch):
+    output = tmp_path / "out"
+    organize_files([str(corpus)], str(output), use_copy=True)
+    digests = _digests(output)
+    assert digests
+    monkeypatch.chdir(tmp_path)
+    library = LibraryIndex("out", os.path.join("out", LIBRARY_FILENAME))
+    _, relisted = library.refresh()
+    library.close()
+    assert relisted <= 1  # only the root, where the run wrote its logs
+    assert _digests(output) == digests
+
+def test_moved_library_keeps_its_digests(corpus, tmp_path):
+    output = tmp_path / "out"
+    organize_files([str(corpus)], str(output), use_copy=True)
+    digests = _digests(output)
+    moved = tmp_path / "moved"
+    os.rename(output, moved)
+    library = LibraryIndex(moved, moved / LIBRARY_FILENAME)
+    _, relisted = library.refresh()
+    library.close()
+    assert relisted <= 1
+    assert _digests(moved) == {str(moved / os.path.relpath(path, output)): digest for path, digest in digests.items()}
+
+def test_time_index_does_not_load_the_engine():
+    code = "import sys, time_index; print(sorted({'photo_organiser', 'io_scheduler', 'watch_folder'} & set(sys.modules)))"
+    output = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.dirname(__file__)),
+                            capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "[]"
@@ -0,0 +1,103 @@
+import io
+import random
+import struct
+from datetime import datetime, timezone
+
+import pytest
+
+from photo_organiser import exif_date, get_date_taken, read_exif_date, read_exif_fields, read_mp4_creation_time
+from synthetic_corpus import _box, _exif_segment, _png_chunk, make_jpeg, make_png, make_video
+
+DATE = datetime(2021, 6, 5, 4, 3, 2, tzinfo=timezone.utc)
+
+def make_heif(date, iloc=None):
+    # ftyp, then meta with an Exif item (iinf) located in mdat (iloc)
+    item = struct.pack(">I", 0) + b"Exif\0\0" + _exif_segment(date)[10:]
+    infe = _box(b"infe", bytes([2, 0, 0, 0]) + struct.pack(">HH4s", 1, 0, b"Exif") + b"\0")
+    iinf = _box(b"iinf", b"\0" * 4 + struct.pack(">H", 1) + infe)
+    ftyp = _box(b"ftyp", b"heic\0\0\0\0mif1heic")
+
+    def meta(offset):
+        location = iloc or _box(b"iloc", b"\0" * 4 + bytes([0x44, 0]) +
+                                struct.pack(">HHHHII", 1, 1, 0, 1, offset, len(item)))
+        return _box(b"meta", b"\0" * 4 + _box(b"hdlr", b"\0" * 8 + b"pict" + b"\0" * 13) + iinf + location)
+
+    return ftyp + meta(len(ftyp) + len(meta(0)) + 8) + _box(b"mdat", item)
+
+def make_png_exif(date):
+    png = make_png(random.Random(1), 300)
+    return png[:33] + _png_chunk(b"eXIf", _exif_segment(date)[10:]) + png[33:]  # after IHDR
+
+IMAGES = {
+    "jpeg": lambda: make_jpeg(random.Random(1), 600, DATE),
+    "png": lambda: make_png_exif(DATE),
+    "heif": lambda: make_heif(DATE),
+}
+
+def _parse(read, data):
+    # A parser may find nothing in corrupt input, but must only fail with ValueError
+    try:
+        return read(io.BytesIO(data))
+    except ValueError:
+        return None
+
+@pytest.mark.parametrize("brand", [b"isom", b"qt  "])
+def test_mp4_creation_time(brand):
+    data = make_video(random.Random(1), 4096, DATE, brand)
+    assert read_mp4_creation_time(io.BytesIO(data)) == DATE
+
+@pytest.mark.parametrize("brand", [b"isom", b"qt  "])
+def test_mp4_truncated_and_corrupt(brand):
+    rng = random.Random(2)
+    data = make_video(rng, 1024, DATE, brand)
+    for n in range(len(data)):
+        _parse(read_mp4_creation_time, data[:n])
+    for _ in range(2000):
+        corrupt = bytearray(data)
+        for _ in range(rng.randint(1, 4)):
+            corrupt[rng.randrange(len(corrupt))] = rng.randrange(256)
+        _parse(read_mp4_creation_time, bytes(corrupt))
+
+def test_mp4_out_of_range_time():
+    mvhd = _box(b"mvhd", b"\x01\0\0\0" + struct.pack(">Q", 2 ** 63) + b"\0" * 100)
+    data = _box(b"ftyp", b"isom\0\0\0\0") + _box(b"moov", mvhd)
+    assert read_mp4_creation_time(io.BytesIO(data)) is None
+
+def test_mp4_corrupt_keys_entry():
+    keys = _box(b"keys", b"\0" * 4 + struct.pack(">I", 1) + struct.pack(">I", 0))
+    moov = _box(b"moov", _box(b"mvhd", b"\0" * 100) + _box(b"meta", b"\0" * 4 + keys))
+    with pytest.raises(ValueError):
+        read_mp4_creation_time(io.BytesIO(_box(b"ftyp", b"qt  \0\0\0\0") + moov))
+
+def test_truncated_video_file_gets_no_date(tmp_path):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(make_video(random.Random(3), 4096, DATE, b"isom")[:30])
+    get_date_taken(path)  # falls through to ffprobe, which may be missing here
+
+@pytest.mark.parametrize("kind", IMAGES)
+def test_exif_date(kind):
+    fields = read_exif_fields(io.BytesIO(IMAGES[kind]()))
+    assert exif_date(fields) == DATE.replace(tzinfo=None)
+
+@pytest.mark.parametrize("kind", IMAGES)
+def test_exif_truncated_and_corrupt(kind):
+    rng = random.Random(4)
+    data = IMAGES[kind]()
+    for n in range(len(data)):
+        _parse(read_exif_fields, data[:n])
+    for _ in range(2000):
+        corrupt = bytearray(data)
+        for _ in range(rng.randint(1, 4)):
+            corrupt[rng.randrange(min(len(corrupt), 400))] = rng.randrange(256)
+        _parse(read_exif_fields, bytes(corrupt))
+
+def test_heif_iloc_count_beyond_its_payload():
+    # A version 2 iloc claiming 2**32 - 1 items in a few bytes
+    iloc = _box(b"iloc", bytes([2, 0, 0, 0, 0x44, 0]) + b"\xff" * 4)
+    with pytest.raises(ValueError):
+        read_exif_fields(io.BytesIO(make_heif(DATE, iloc)))
+
+def test_truncated_jpeg_file_has_no_date(tmp_path):
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(make_jpeg(random.Random(1), 600, DATE)[:40])
+    assert read_exif_date(path) is None
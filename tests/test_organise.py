@@ -0,0 +1,37 @@
+import random
+from datetime import datetime
+
+import photo_organiser
+from photo_organiser import HEAD_READ_SIZE, hash_file, organize_files, read_file_once
+from synthetic_corpus import make_jpeg
+
+def test_organise_into_new_output_folder(corpus, tmp_path):
+    output = tmp_path / "not" / "yet" / "there"
+    result = organize_files([str(corpus)], str(output), use_copy=True)
+    assert result["input_files"] == 40
+    assert (output / ".organiser_cache.sqlite").is_file()
+    assert result["organized"] + result["fallback"] + result["duplicates"] + result["unsure"] == 40
+
+def test_full_digest_in_the_same_read_as_the_head(tmp_path):
+    path = tmp_path / "big.jpg"
+    path.write_bytes(bytes(range(256)) * 5000)  # well past HEAD_READ_SIZE
+    _, _, _, full = read_file_once(path, path.stat().st_size, want_date=False, want_full=True)
+    assert full == hash_file(path)
+    _, _, _, full = read_file_once(path, path.stat().st_size, want_date=False)
+    assert full is None
+
+def test_library_matches_are_read_once(corpus, tmp_path, monkeypatch):
+    large = corpus / "large.jpg"
+    large.write_bytes(make_jpeg(random.Random(1), 3 * HEAD_READ_SIZE, datetime(2020, 5, 1)))
+    output = tmp_path / "out"
+    organize_files([str(corpus)], str(output), use_copy=True, use_cache=False)
+    opened = []
+
+    def counting_open(file, *args, **kwargs):
+        opened.append(str(file))
+        return open(file, *args, **kwargs)
+
+    monkeypatch.setattr(photo_organiser, "open", counting_open, raising=False)
+    result = organize_files([str(corpus)], str(output), use_copy=True, plan=True, use_cache=False)
+    assert result["library_matches"] == 41
+    assert opened.count(str(large)) == 1
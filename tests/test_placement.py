@@ -0,0 +1,86 @@
+import errno
+import os
+
+import pytest
+
+import photo_organiser
+from photo_organiser import copy_file, link_file, move_file
+
+MTIME_NS = 1_500_000_000_123_456_789
+DATA = bytes(range(256)) * 4096  # 1 MiB
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "source.jpg"
+    path.write_bytes(DATA)
+    os.utime(path, ns=(MTIME_NS, MTIME_NS))
+    return path
+
+def _fail(*args, **kwargs):
+    raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+class FakeFcntl:
+    # A FICLONE that works, copying the data the way a reflink would appear to
+    @staticmethod
+    def ioctl(dst_fd, request, src_fd):
+        assert request == photo_organiser.FICLONE
+        os.lseek(src_fd, 0, os.SEEK_SET)
+        while True:
+            block = os.read(src_fd, 65536)
+            if not block:
+                return 0
+            os.write(dst_fd, block)
+
+def _half_then_fail(src_fd, dst_fd, count, *args):
+    # Writes part of the file before failing, which the next method must undo
+    os.write(dst_fd, os.read(src_fd, count // 2))
+    raise OSError(errno.EIO, "Input/output error")
+
+def _assert_copied(source, target):
+    assert target.read_bytes() == DATA
+    assert os.stat(target).st_mtime_ns == MTIME_NS
+    assert os.stat(target).st_mode == os.stat(source).st_mode
+
+@pytest.mark.parametrize("expected", ["reflink", "copy_file_range", "sendfile", "buffered"])
+def test_copy_falls_back_step_by_step(source, tmp_path, monkeypatch, expected):
+    steps = ["reflink", "copy_file_range", "sendfile", "buffered"]
+    failing = steps[:steps.index(expected)]
+    monkeypatch.setattr(photo_organiser, "fcntl", FakeFcntl if "reflink" not in failing else None)
+    if "copy_file_range" in failing:
+        monkeypatch.setattr(os, "copy_file_range", _half_then_fail, raising=False)
+    if "sendfile" in failing:
+        monkeypatch.setattr(os, "sendfile", _fail, raising=False)
+    target = tmp_path / "target.jpg"
+    assert copy_file(source, target) == expected
+    _assert_copied(source, target)
+
+def test_copy_when_reflink_ioctl_fails(source, tmp_path, monkeypatch):
+    class UnsupportedFcntl:
+        ioctl = staticmethod(_fail)
+
+    monkeypatch.setattr(photo_organiser, "fcntl", UnsupportedFcntl)
+    target = tmp_path / "target.jpg"
+    assert copy_file(source, target) != "reflink"
+    _assert_copied(source, target)
+
+def test_move_across_devices_copies_and_removes(source, tmp_path, monkeypatch):
+    monkeypatch.setattr(os, "rename", _fail)
+    target = tmp_path / "target.jpg"
+    mode = os.stat(source).st_mode
+    assert move_file(source, target) != "rename"
+    assert not source.exists()
+    assert target.read_bytes() == DATA
+    assert os.stat(target).st_mtime_ns == MTIME_NS
+    assert os.stat(target).st_mode == mode
+
+def test_hardlink_across_devices_copies(source, tmp_path, monkeypatch):
+    monkeypatch.setattr(os, "link", _fail)
+    target = tmp_path / "target.jpg"
+    assert link_file(source, target) != "hardlink"
+    assert not os.path.samefile(source, target)
+    _assert_copied(source, target)
+
+def test_hardlink_on_the_same_device(source, tmp_path):
+    target = tmp_path / "target.jpg"
+    assert link_file(source, target) == "hardlink"
+    assert os.path.samefile(source, target)
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+import photo_organiser
+from photo_organiser import JOURNAL_FILENAME, PLAN_FILENAME, execute_plan, organize_files, read_plan
+
+class Crash(Exception):
+    pass
+
+def _tree(root):
+    # Relative path -> content digest of every organised file
+    tree = {}
+    for folder, _, names in os.walk(root):
+        for name in names:
+            if name.startswith((".organiser", "organiser_")) or name.endswith(".csv"):
+                continue
+            path = os.path.join(folder, name)
+            with open(path, "rb") as f:
+                tree[os.path.relpath(path, root)] = hashlib.sha256(f.read()).hexdigest()
+    return tree
+
+def _crash_on(monkeypatch, name, call, before=None):
+    # Makes the call-th call of photo_organiser.<name> raise Crash, after running before(*args)
+    real = getattr(photo_organiser, name)
+    calls = []
+
+    def crashing(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == call:
+            if before is not None:
+                before(*args, **kwargs)
+            raise Crash()
+        return real(*args, **kwargs)
+
+    monkeypatch.setattr(photo_organiser, name, crashing)
+
+@pytest.fixture
+def expected(corpus, tmp_path):
+    output = tmp_path / "clean"
+    organize_files([str(corpus)], str(output), use_copy=True, workers=1)
+    return _tree(output)
+
+def test_resume_after_crash_mid_copy(corpus, tmp_path, monkeypatch, expected):
+    output = tmp_path / "out"
+
+    def partial_copy(source, target):
+        with open(source, "rb") as src, open(target, "wb") as dst:
+            dst.write(src.read()[:100])
+
+    _crash_on(monkeypatch, "copy_file", 10, partial_copy)
+    with pytest.raises(Crash):
+        organize_files([str(corpus)], str(output), use_copy=True, workers=1)
+    monkeypatch.undo()
+    result = execute_plan(output / PLAN_FILENAME)
+    assert result["conflicts"] == 0
+    assert _tree(output) == expected
+
+def test_resume_after_crash_between_move_and_journal(corpus, tmp_path, monkeypatch, expected):
+    output = tmp_path / "out"
+    _crash_on(monkeypatch, "move_file", 5, lambda source, target: os.rename(source, target))
+    with pytest.raises(Crash):
+        organize_files([str(corpus)], str(output), workers=1)
+    monkeypatch.undo()
+    result = execute_plan(output / PLAN_FILENAME)
+    assert result["conflicts"] == 0
+    assert result["placements"]["verified"] == 1
+    assert _tree(output) == expected
+    assert not [names for _, _, names in os.walk(corpus) if names]
+
+@pytest.mark.parametrize("use_copy", [True, False])
+def test_planned_target_taken_by_another_file(corpus, tmp_path, use_copy):
+    output = tmp_path / "out"
+    organize_files([str(corpus)], str(output), use_copy=use_copy, plan=True)
+    _, ops = read_plan(output / PLAN_FILENAME)
+    op = next(op for op in ops if op["action"] != "record" and not op["duplicate"])
+    os.makedirs(os.path.dirname(op["target"]), exist_ok=True)
+    with open(op["target"], "wb") as f:
+        f.write(b"not the organiser's")
+    result = execute_plan(output / PLAN_FILENAME)
+    assert result["conflicts"] == 1
+    with open(op["target"], "rb") as f:
+        assert f.read() == b"not the organiser's"
+    assert os.path.exists(op["source"])
+    # Running the plan again still leaves the file alone
+    assert execute_plan(output / PLAN_FILENAME)["conflicts"] == 1
+    assert os.path.exists(output / JOURNAL_FILENAME)
+
+def test_hardlink_duplicate_of_conflicting_original(corpus, tmp_path):
+    output = tmp_path / "out"
+    organize_files([str(corpus)], str(output), use_copy=True, plan=True, duplicate_mode="hardlink")
+    _, ops = read_plan(output / PLAN_FILENAME)
+    link = next(op for op in ops if op["link"])
+    os.makedirs(os.path.dirname(link["duplicate_of"]), exist_ok=True)
+    with open(link["duplicate_of"], "wb") as f:
+        f.write(b"not the organiser's")
+    execute_plan(output / PLAN_FILENAME)
+    with open(link["source"], "rb") as src, open(link["target"], "rb") as dst:
+        assert dst.read() == src.read()
+
+def test_plan_made_with_relative_paths_runs_from_another_folder(corpus, tmp_path, monkeypatch, expected):
+    elsewhere = tmp_path / "elsewhere"
+    elsewhere.mkdir()
+    monkeypatch.chdir(tmp_path)
+    organize_files(["in"], "rel2", use_copy=True, plan=True)
+    monkeypatch.chdir(elsewhere)
+    execute_plan(str(tmp_path / "rel2" / PLAN_FILENAME))
+    assert _tree(tmp_path / "rel2") == expected
+    assert not os.listdir(elsewhere)
+
+def test_relative_output_in_older_plan_is_the_plan_folder(corpus, tmp_path, monkeypatch, expected):
+    output = tmp_path / "out"
+    organize_files([str(corpus)], str(output), use_copy=True, plan=True)
+    plan_path = output / PLAN_FILENAME
+    header, *ops = plan_path.read_text(encoding="utf-8").splitlines(keepends=True)
+    header = header.replace(json.dumps(str(output)), json.dumps("out"))
+    plan_path.write_text(header + "".join(ops), encoding="utf-8")
+    monkeypatch.chdir(corpus)
+    execute_plan(str(plan_path))
+    assert _tree(output) == expected
+    assert not os.path.exists(corpus / "out")
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Thumbnail engine for the Folder Naming Assistant.
+
+Images are decoded as little as possible: the thumbnail embedded in the EXIF
+data is used when it is large enough, and JPEGs are otherwise decoded in
+draft mode, which lets libjpeg scale by 1/2, 1/4 or 1/8 while decoding.
+Thumbnails are kept on disk keyed by path, size and mtime, and decoded
+PhotoImages are kept in memory in an LRU bounded by pixel count.
+"""
+import os
+import io
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from PIL import ExifTags, Image
+
+THUMBNAIL_SIZE = (350, 350)
+DISK_CACHE_MAX_SIDE = 512
+DISK_CACHE_QUALITY = 85
+MEMORY_PIXEL_BUDGET = 32 * 1024 * 1024
+EXIF_THUMBNAIL_OFFSET = 0x0201
+EXIF_THUMBNAIL_LENGTH = 0x0202
+
+def default_cache_dir():
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "photo_tools", "thumbnails")
+
+def read_exif_thumbnail(image):
+    # Returns the JPEG thumbnail stored in EXIF IFD1, or None
+    raw = image.info.get("exif")
+    if not raw:
+        return None
+    try:
+        ifd1 = image.getexif().get_ifd(ExifTags.IFD.IFD1)
+        offset, length = ifd1.get(EXIF_THUMBNAIL_OFFSET), ifd1.get(EXIF_THUMBNAIL_LENGTH)
+        if not offset or not length:
+            return None
+        tiff = raw[6:] if raw.startswith(b"Exif\0\0") else raw
+        thumbnail = Image.open(io.BytesIO(tiff[offset:offset + length]))
+        thumbnail.load()
+        return thumbnail
+    except Exception:
+        return None
+
+def decode_scaled(path, box):
+    """Decodes path to an image that fits inside box, decoding as little as possible."""
+    image = Image.open(path)
+    if image.format == "JPEG":
+        thumbnail = read_exif_thumbnail(image)
+        # EXIF thumbnails are often 160x120 and may be letterboxed; only use
+        # one that covers the requested box and keeps the image's shape
+        if thumbnail is not None:
+            scale = min(box[0] / image.width, box[1] / image.height)
+            needed = (image.width * scale, image.height * scale)
+            same_shape = abs(thumbnail.width * image.height - thumbnail.height * image.width) <= image.width
+            if same_shape and thumbnail.width >= needed[0] and thumbnail.height >= needed[1]:
+                image = thumbnail
+        if image.format == "JPEG":
+            image.draft("RGB", box)
+    image.thumbnail(box)
+    if image.mode not in ("RGB", "RGBA", "L"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+    return image
+
+class ThumbnailCache:
+    """Scaled images for Tk, cached in memory and on disk.
+
+    image() is safe to call from worker threads and returns a PIL image,
+    using the on-disk cache for boxes up to DISK_CACHE_MAX_SIDE. photo()
+    must be called on the Tk thread; it keeps PhotoImages in an LRU holding
+    at most memory_pixels pixels.
+    """
+
+    def __init__(self, cache_dir=None, memory_pixels=MEMORY_PIXEL_BUDGET):
+        self.cache_dir = Path(cache_dir or default_cache_dir())
+        self.memory_pixels = memory_pixels
+        self.photos = OrderedDict()
+        self.pixels = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _key(self, path, box):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (os.path.realpath(path), st.st_size, st.st_mtime_ns, tuple(box))
+
+    def _disk_path(self, key):
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return self.cache_dir / digest[:2] / f"{digest}.thumb"
+
+    def image(self, path, box=THUMBNAIL_SIZE, key=None):
+        key = key or self._key(path, box)
+        if key is None:
+            raise FileNotFoundError(path)
+        use_disk = max(box) <= DISK_CACHE_MAX_SIDE
+        if use_disk:
+            disk_path = self._disk_path(key)
+            try:
+                image = Image.open(disk_path)
+                image.load()
+                with self.lock:
+                    self.disk_hits += 1
+                return image
+            except (OSError, ValueError):
+                pass
+        image = decode_scaled(path, box)
+        with self.lock:
+            self.misses += 1
+        if use_disk:
+            self._store(disk_path, image)
+        return image
+
+    def _store(self, disk_path, image):
+        # Written to a temp name first so a reader never sees half a file
+        try:
+            disk_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = disk_path.with_name(f"{disk_path.stem}.{threading.get_ident()}.tmp")
+            if image.mode == "RGB" or image.mode == "L":
+                image.save(temp_path, "JPEG", quality=DISK_CACHE_QUALITY)
+            else:
+                image.save(temp_path, "PNG")
+            os.replace(temp_path, disk_path)
+        except OSError:
+            pass
+
+    def photo(self, path, box=THUMBNAIL_SIZE, image=None):
+        """Returns a PhotoImage of path scaled to fit box; Tk thread only.
+
+        image, if given, is an already decoded result of image(), e.g. from a
+        background prefetch.
+        """
+        from PIL import ImageTk
+        key = self._key(path, box)
+        if key is None:
+            raise FileNotFoundError(path)
+        photo = self.photos.get(key)
+        if photo is not None:
+            self.photos.move_to_end(key)
+            self.hits += 1
+            return photo
+        if image is None:
+            image = self.image(path, box, key)
+        photo = ImageTk.PhotoImage(image)
+        self.photos[key] = photo
+        self.pixels += photo.width() * photo.height()
+        while self.pixels > self.memory_pixels and len(self.photos) > 1:
+            _, old = self.photos.popitem(last=False)
+            self.pixels -= old.width() * old.height()
+        return photo
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Capture-time index and event clustering for the Folder Naming Assistant.
+
+The organiser records the date of every file it places in the library
+index (.organiser_library.sqlite), so the times of a folder's photos are
+read from there without opening a single image. Folders the organiser did
+not fill fall back to the date in their name (YYYY-MM-DD), taken as noon.
+Files in the organiser's duplicates/, near_duplicates/ and unsure/ folders
+are left out: they are indexed for duplicate detection, not as events.
+
+cluster_folders() groups folders into events: sorted by time, a folder
+joins the previous event when its first photo is at most gap_hours after
+the last photo so far. The gaps are computed over the sorted times with
+NumPy when it is installed.
+"""
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from library_layout import LIBRARY_FILENAME, MANAGED_FOLDERS
+
+DEFAULT_EVENT_GAP_HOURS = 24
+FOLDER_DATE = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+EPOCH = datetime(1970, 1, 1)
+
+def _seconds(date):
+    # Wall-clock seconds since 1970; aware dates (e.g. MP4 times in UTC) are
+    # converted to this computer's local time first
+    if date.tzinfo is not None:
+        date = date.astimezone().replace(tzinfo=None)
+    return (date - EPOCH).total_seconds()
+
+def find_library(folder):
+    """Returns the library index in folder or the nearest parent holding one, or None."""
+    folder = os.path.realpath(folder)
+    while True:
+        db_path = os.path.join(folder, LIBRARY_FILENAME)
+        if os.path.isfile(db_path):
+            return db_path
+        parent = os.path.dirname(folder)
+        if parent == folder:
+            return None
+        folder = parent
+
+def _name_date(folder):
+    match = FOLDER_DATE.match(os.path.basename(folder))
+    if match is None:
+        return None
+    try:
+        return _seconds(datetime(*map(int, match.groups()), 12))
+    except ValueError:
+        return None
+
+class TimeIndex:
+    """First and last capture time (in seconds) of the photos in each library folder."""
+
+    def __init__(self, root):
+        self.root = os.path.realpath(root)
+        self.spans = {}
+        db_path = find_library(self.root)
+        if db_path is not None:
+            try:
+                self._load(db_path)
+            except sqlite3.Error:
+                self.spans = {}  # unreadable index: folder names only
+
+    def _load(self, db_path):
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(files)")}
+            if "taken" not in columns:
+                return
+            # Stored paths start with the output folder as the organiser was
+            # given it (possibly relative), which is the shortest folder listed
+            roots = [path for (path,) in conn.execute("SELECT path FROM dirs")]
+            if not roots:
+                return
+            stored_root = min(roots, key=len)
+            library_root = os.path.dirname(db_path)
+            folders = {}
+            for folder, taken in conn.execute("SELECT dir, taken FROM files WHERE taken IS NOT NULL"):
+                if folder not in folders:
+                    relative = os.path.relpath(folder, stored_root)
+                    managed = relative.split(os.sep)[0] in MANAGED_FOLDERS
+                    folders[folder] = None if managed else os.path.normpath(os.path.join(library_root, relative))
+                path = folders[folder]
+                if path is None:
+                    continue
+                try:
+                    seconds = _seconds(datetime.fromisoformat(taken))
+                except ValueError:
+                    continue
+                span = self.spans.get(path)
+                self.spans[path] = (seconds, seconds) if span is None else (
+                    min(span[0], seconds), max(span[1], seconds))
+        finally:
+            conn.close()
+
+    def span(self, folder):
+        """Returns (first, last) capture time of folder, or None if it has no date."""
+        span = self.spans.get(folder)
+        if span is None:
+            seconds = _name_date(folder)
+            if seconds is not None:
+                span = (seconds, seconds)
+        return span
+
+def _event_starts(firsts, lasts, gap):
+    # firsts is sorted; True where a folder starts a new event
+    if np is not None:
+        firsts = np.asarray(firsts, dtype=np.float64)
+        reach = np.maximum.accumulate(np.asarray(lasts, dtype=np.float64))
+        return np.concatenate(([True], firsts[1:] - reach[:-1] > gap)).tolist()
+    starts = []
+    reach = None
+    for first, last in zip(firsts, lasts):
+        starts.append(reach is None or first - reach > gap)
+        reach = last if reach is None else max(reach, last)
+    return starts
+
+def cluster_folders(folders, index, gap_hours=DEFAULT_EVENT_GAP_HOURS):
+    """Groups folders into events; returns lists of folders, in order of their first folder's path.
+
+    Folders are only grouped with folders sharing the parent of their year
+    folder, so duplicates/2023/... never joins an event in 2023/... . A
+    folder without any date is an event of its own.
+    """
+    groups = {}
+    events = []
+    for folder in folders:
+        span = index.span(folder)
+        if span is None:
+            events.append([folder])
+        else:
+            groups.setdefault(os.path.dirname(os.path.dirname(folder)), []).append((span, folder))
+    for members in groups.values():
+        members.sort()
+        starts = _event_starts([span[0] for span, _ in members], [span[1] for span, _ in members],
+                               gap_hours * 3600)
+        for start, (_, folder) in zip(starts, members):
+            if start:
+                events.append([])
+            events[-1].append(folder)
+    for event in events:
+        event.sort()
+    events.sort(key=lambda event: event[0])
+    return events
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""Change sources for the organiser's watch mode.
+
+Both watchers report paths of matching files that may have been created or
+changed; deciding when a file has finished arriving is left to the caller.
+InotifyWatcher uses Linux inotify through ctypes and sleeps in select() while
+nothing happens. PollingWatcher walks the folders every few seconds; it is
+used on other platforms and for network shares, where inotify does not see
+changes made by other machines.
+"""
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+from fast_walk import DEFAULT_WALK_WORKERS, walk_matching
+
+WATCH_POLL_INTERVAL = 2.0
+EVENT_BUFFER_SIZE = 64 * 1024
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+_libc = None
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        _libc = libc
+    return _libc
+
+def _matches(name, extensions):
+    return extensions is None or os.path.splitext(name)[1].lower() in extensions
+
+class InotifyWatcher:
+    """Watches folder trees with inotify; new subfolders are watched as they appear."""
+
+    kind = "inotify"
+
+    def __init__(self, roots, extensions=None):
+        self.libc = _load_libc()
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1 failed: {os.strerror(err)}")
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.extensions = extensions
+        self.watches = {}
+        self.found = set()
+        try:
+            for root in self.roots:
+                self._add_tree(root, self.found)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_tree(self, root, found):
+        # Each folder is watched before it is listed, so a file created in
+        # between is reported by the listing, by an event, or by both
+        stack = [root]
+        while stack:
+            folder = stack.pop()
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err == errno.ENOSPC:
+                    raise OSError(err, "inotify watch limit reached; raise fs.inotify.max_user_watches")
+                continue  # removed or unreadable since it was seen
+            self.watches[wd] = folder
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif _matches(entry.name, self.extensions) and entry.is_file():
+                                found.add(entry.path)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+
+    def changes(self, timeout=None):
+        """Returns paths that may have changed, waiting up to timeout seconds (None: forever).
+
+        The first call returns the matching files that were already present.
+        """
+        if self.found:
+            found, self.found = self.found, set()
+            return found
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self.fd, EVENT_BUFFER_SIZE)
+        except BlockingIOError:
+            return set()
+        found = set()
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+            offset += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped, so everything is looked at again
+                for root in self.roots:
+                    self._add_tree(root, found)
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            folder = self.watches.get(wd)
+            if folder is None or not name:
+                continue
+            path = os.path.join(folder, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._add_tree(path, found)
+            elif _matches(path, self.extensions):
+                found.add(path)
+        return found
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+class PollingWatcher:
+    """Finds changes by walking the folders every interval seconds and comparing size and mtime."""
+
+    kind = "polling"
+
+    def __init__(self, roots, extensions=None, interval=WATCH_POLL_INTERVAL, workers=DEFAULT_WALK_WORKERS):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.extensions = extensions
+        self.interval = interval
+        self.workers = workers
+        self.snapshot = self._scan()
+        self.found = set(self.snapshot)
+        self.next_poll = time.monotonic() + interval
+
+    def _scan(self):
+        snapshot = {}
+        for folder, names in walk_matching(self.roots, self.extensions, self.workers):
+            for name in names:
+                path = os.path.join(folder, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (st.st_size, st.st_mtime_ns)
+        return snapshot
+
+    def changes(self, timeout=None):
+        if self.found:
+            found, self.found = self.found, set()
+            return found
+        wait = max(0.0, self.next_poll - time.monotonic())
+        if timeout is not None and wait > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(wait)
+        snapshot = self._scan()
+        self.next_poll = time.monotonic() + self.interval
+        changed = {path for path, stamp in snapshot.items() if self.snapshot.get(path) != stamp}
+        self.snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+def open_watcher(roots, extensions=None, poll=False, interval=WATCH_POLL_INTERVAL, log_callback=None):
+    """Returns an InotifyWatcher where possible, otherwise a PollingWatcher."""
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(roots, extensions)
+        except (OSError, AttributeError) as e:
+            if log_callback is not None:
+                log_callback(f"⚠ inotify unavailable ({e}); polling every {interval:g}s instead.")
+    return PollingWatcher(roots, extensions, interval)